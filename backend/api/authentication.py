@@ -0,0 +1,217 @@
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from time import monotonic, time_ns
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from api.performance import set_label
+from recipes.utils import (add_version, bump_version, get_version,
+                           get_version_key)
+
+User = get_user_model()
+
+
+class LocalTokenCache:
+    """Класс ограниченного кэша токенов в памяти процесса.
+
+    Хранит не больше size записей, вытесняя давно не использованные,
+    и не отдаёт записи старше timeout секунд.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+    def get(self, key):
+        """Метод получения записи по ключу токена."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Метод сохранения записи с вытеснением самых старых."""
+        with self.lock:
+            self.entries[key] = (value, monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def record(self, source):
+        """Метод учёта источника найденного токена."""
+        with self.lock:
+            self.stats[source] += 1
+
+    def delete_user(self, user_id):
+        """Метод удаления всех записей токенов пользователя."""
+        with self.lock:
+            for key in [key for key, ((cached_id, *_), _)
+                        in self.entries.items() if cached_id == user_id]:
+                del self.entries[key]
+
+    def clear(self):
+        """Метод очистки кэша и статистики."""
+        with self.lock:
+            self.entries.clear()
+            self.stats.clear()
+
+
+local_cache = LocalTokenCache(settings.AUTH_TOKEN_CACHE_SIZE,
+                              settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+
+def get_token_version_key(user_id):
+    """Функция получения ключа кэша версии токенов пользователя."""
+    return get_version_key(settings.AUTH_TOKEN_VERSION_KEY_PREFIX, User,
+                           user_id)
+
+
+def get_shared_key(key):
+    """Функция получения ключа общего кэша для токена.
+
+    В общем кэше хранится хеш токена, а не сам токен.
+    """
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'{settings.AUTH_TOKEN_CACHE_KEY_PREFIX}:{digest}'
+
+
+def invalidate_user_tokens(user_id):
+    """Функция сброса кэшированных токенов пользователя.
+
+    Смена версии в общем кэше делает недействительными записи
+    во всех процессах приложения.
+    """
+    local_cache.delete_user(user_id)
+    if settings.AUTH_TOKEN_SHARED_CACHE:
+        bump_version(get_token_version_key(user_id))
+
+
+def get_token_cache_stats():
+    """Функция получения статистики кэша токенов текущего процесса."""
+    stats = dict(local_cache.stats)
+    hits = stats.get('local', 0) + stats.get('shared', 0)
+    total = hits + stats.get('db', 0)
+    stats['size'] = len(local_cache.entries)
+    stats['hit_rate'] = round(hits / total, 4) if total else None
+    return stats
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Класс аутентификации по токену с кэшированием.
+
+    Токен ищется в кэше процесса, затем в общем кэше и только потом в
+    базе данных. В кэшах хранятся только id пользователя и поля
+    cached_user_fields, нужные для проверки прав, без пароля и личных
+    данных. Остальные поля пользователя загружаются из базы данных при
+    первом обращении к ним. Записи кэшей проверяются по версии токенов
+    пользователя, которая меняется при выходе, смене пароля и любом
+    другом сохранении пользователя. Источник токена попадает в метрики
+    запроса, а доля попаданий в кэш, которую get_token_cache_stats
+    возвращает для процесса, выводится командой benchmark.
+    """
+
+    cached_user_fields = ('is_active', 'is_staff', 'is_superuser')
+
+    def authenticate_credentials(self, key):
+        source, token = self.get_cached_token(key)
+        if token is None:
+            source = 'db'
+            fetched_at = time_ns()
+            user, token = super().authenticate_credentials(key)
+            self.cache_token(key, token, fetched_at)
+        local_cache.record(source)
+        set_label('auth', source)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        return token.user, token
+
+    @classmethod
+    def get_user_fields(cls):
+        """Метод получения полей пользователя записи кэша.
+
+        Поля идут в порядке полей модели, как требует from_db.
+        """
+        names = {User._meta.pk.attname, *cls.cached_user_fields}
+        return [field.attname for field in User._meta.concrete_fields
+                if field.attname in names]
+
+    @classmethod
+    def make_entry(cls, token, version):
+        """Метод создания записи кэша по токену из базы данных."""
+        return (token.user_id,
+                tuple(getattr(token.user, name)
+                      for name in cls.get_user_fields()),
+                version)
+
+    @classmethod
+    def make_token(cls, key, entry):
+        """Метод создания токена с пользователем по записи кэша."""
+        user_id, values, _ = entry
+        user = User.from_db(User.objects.db, cls.get_user_fields(), values)
+        token = Token.from_db(Token.objects.db, ('key', 'user_id'),
+                              (key, user_id))
+        token.user = user
+        return token
+
+    @classmethod
+    def get_cached_token(cls, key):
+        """Метод поиска действительного токена в кэшах.
+
+        Возвращает источник и токен или None, если токена нет в кэшах
+        или его версия устарела.
+        """
+        shared = settings.AUTH_TOKEN_SHARED_CACHE
+        entry = local_cache.get(key)
+        if entry is not None:
+            user_id, _, version = entry
+            if not shared or version == get_version(
+                    get_token_version_key(user_id)):
+                return 'local', cls.make_token(key, entry)
+        if not shared:
+            return None, None
+        entry = cache.get(get_shared_key(key))
+        if entry is not None:
+            user_id, _, version = entry
+            if version == get_version(get_token_version_key(user_id)):
+                local_cache.set(key, entry)
+                return 'shared', cls.make_token(key, entry)
+        return None, None
+
+    @classmethod
+    def cache_token(cls, key, token, fetched_at):
+        """Метод сохранения токена в кэшах с текущей версией.
+
+        Если версия сменилась после чтения токена из базы данных, токен
+        мог быть удалён параллельным запросом и в кэш не сохраняется.
+        Отсутствующая версия создаётся со временем чтения токена: сброс
+        после чтения записал бы более позднюю версию.
+        """
+        version = None
+        if settings.AUTH_TOKEN_SHARED_CACHE:
+            version_key = get_token_version_key(token.user_id)
+            add_version(version_key, fetched_at)
+            version = get_version(version_key)
+            if int(version) > fetched_at:
+                return
+            cache.set(get_shared_key(key), cls.make_entry(token, version),
+                      settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        local_cache.set(key, cls.make_entry(token, version))
@@ -0,0 +1,76 @@
+from bisect import bisect_left
+from collections import namedtuple
+
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import IngredientSerializer, TagSerializer
+from recipes.models import Ingredient, Tag
+from recipes.utils import get_catalog_version
+
+Snapshot = namedtuple('Snapshot', ('version', 'content', 'items', 'keys',
+                                   'rows'))
+
+
+class CatalogSnapshot:
+    """Класс снимка справочника, хранящегося в памяти процесса.
+
+    Содержит заранее отрендеренный в JSON список объектов модели,
+    отдельные объекты по id и отсортированный массив значений поля
+    key_field для поиска по начальным символам. Снимок перестраивается,
+    когда меняется версия справочника.
+    """
+
+    renderer = JSONRenderer()
+
+    def __init__(self, model, serializer_class, key_field=None):
+        self.model = model
+        self.serializer_class = serializer_class
+        self.key_field = key_field
+        self.snapshot = None
+
+    def build(self, version):
+        """Метод для построения снимка из базы данных."""
+        items = {}
+        rows = []
+        for obj in self.model.objects.all():
+            data = self.serializer_class(obj).data
+            row = self.renderer.render(data)
+            items[obj.pk] = row
+            rows.append((data.get(self.key_field), row))
+        content = b'[' + b','.join(row for key, row in rows) + b']'
+        sorted_keys = sorted_rows = ()
+        if self.key_field is not None:
+            rows.sort(key=lambda item: item[0])
+            sorted_keys = tuple(key for key, row in rows)
+            sorted_rows = tuple(row for key, row in rows)
+        return Snapshot(version, content, items, sorted_keys, sorted_rows)
+
+    def get(self):
+        """Метод для получения актуального снимка справочника."""
+        version = get_catalog_version(self.model)
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.version != version:
+            snapshot = self.build(version)
+            self.snapshot = snapshot
+        return snapshot
+
+    def get_item(self, pk):
+        """Метод для получения отрендеренного объекта по id."""
+        return self.get().items.get(pk)
+
+    def filter_startswith(self, prefix):
+        """Метод для получения объектов, поле key_field которых начинается
+        с prefix.
+        """
+        snapshot = self.get()
+        if not prefix:
+            return snapshot.content
+        start = bisect_left(snapshot.keys, prefix)
+        end = bisect_left(snapshot.keys,
+                          prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+        return b'[' + b','.join(snapshot.rows[start:end]) + b']'
+
+
+tag_snapshot = CatalogSnapshot(Tag, TagSerializer)
+ingredient_snapshot = CatalogSnapshot(Ingredient, IngredientSerializer,
+                                      key_field='name')
@@ -1,11 +1,35 @@
 from django.contrib.auth import get_user_model
+from django_filters.constants import EMPTY_VALUES
 from django_filters.rest_framework import FilterSet, filters
 
 from recipes.models import Ingredient, Recipe
+from recipes.search import search_recipes
 
 User = get_user_model()
 
 
+class StableOrderingFilter(filters.OrderingFilter):
+    """Фильтр сортировки с уникальным полем id в конце.
+
+    Объекты с одинаковыми значениями полей сортировки упорядочиваются по
+    id в направлении последнего поля, поэтому страницы не пересекаются
+    и не пропускают объекты.
+    """
+
+    def filter(self, qs, value):
+        """Метод сортировки queryset по значениям параметра."""
+        if value in EMPTY_VALUES:
+            return qs
+        ordering = [
+            self.get_ordering_value(param)
+            for param in value
+            if param not in EMPTY_VALUES
+        ]
+        if ordering:
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return qs.order_by(*ordering)
+
+
 class IngredientFilter(FilterSet):
     """Фильтр для эндпоинта api/ingredients.
 
@@ -27,14 +51,22 @@ class RecipesFilter(FilterSet):
 
     Позволяет производить фильтрацию по автору,
     нескольким тэгам и наличию рецепта в избранном
-    или списке покупок.
+    или списке покупок, полнотекстовый поиск по названию и описанию,
+    а также сортировку по дате публикации и популярности.
     """
 
     tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    search = filters.CharFilter(method='filter_search')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    ordering = StableOrderingFilter(
+        fields=(
+            ('pub_date', 'pub_date'),
+            ('favourites_count', 'favorites_count'),
+        )
+    )
 
     class Meta:
         """Класс Meta для фильтра."""
@@ -60,3 +92,15 @@ class RecipesFilter(FilterSet):
             return queryset.filter(
                 shopping_carts__user=self.request.user.id)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Метод класса фильтра.
+
+        Выполняет полнотекстовый поиск по полю search. Если сортировка
+        не задана параметром ordering, результаты упорядочиваются по
+        релевантности.
+        """
+        queryset = search_recipes(queryset, value)
+        if not self.data.get('ordering'):
+            queryset = queryset.order_by('-search_rank', '-pub_date', '-id')
+        return queryset
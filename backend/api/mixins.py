@@ -1,13 +1,56 @@
+from hashlib import md5
+
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-from rest_framework import status
+from django.utils.cache import (get_conditional_response, patch_vary_headers,
+                                quote_etag)
+from django.utils.http import http_date
+from rest_framework import exceptions, serializers, status
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from recipes.models import Recipe
+from api.performance import measure
+from recipes.utils import (bulk_delete_if_present, bulk_insert_if_absent,
+                           delete_if_present, get_catalog_last_modified,
+                           get_catalog_version, insert_if_absent)
 
 User = get_user_model()
 
 
+class TimedSerializerMixin:
+    """Миксин для учёта времени сериализации ответа.
+
+    Время получения data сериализатора попадает в метрику serializer
+    заголовка Server-Timing. Вложенные сериализаторы учитываются
+    в составе внешнего.
+    """
+
+    @property
+    def data(self):
+        with measure('serializer'):
+            return super().data
+
+
+class InsertIfAbsentMixin:
+    """Миксин для создания объекта сериализатором одним запросом INSERT.
+
+    Уникальность объекта проверяет ограничение базы данных, а не
+    валидатор сериализатора. Если объект уже существует, вызывается
+    ValidationError с сообщением unique_message.
+    """
+
+    unique_message = None
+
+    def create(self, validated_data):
+        instance = self.Meta.model(**validated_data)
+        if not insert_if_absent(instance):
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [self.unique_message]})
+        return instance
+
+
 class PostDeleteDBMixin:
     """Миксин для обработки запросов.
 
@@ -16,35 +59,172 @@ class PostDeleteDBMixin:
     """
 
     @staticmethod
+    @transaction.atomic
     def process_request(request, model=None, serializer_cls=None,
                         err_msg="", attrs=None):
         """Метод класса, отвечающий за обработку POST и DELETE запросов.
 
         В качестве аргументов принимает: объект request, модель,
         класс сериализатора, шаблон сообщения об ошибке и атрибуты для
-        сериализатора.
+        сериализатора. Объект добавляется и удаляется одним запросом,
+        существование связанных объектов при удалении проверяется
+        только если удалять было нечего.
         """
-        user = request.user
-        data = {'user': user.id, }
-        data.update(attrs)
-
         if request.method == "POST":
             serializer = serializer_cls(
-                data=data,
-                context={'request': request,
-                         'err_msg': err_msg})
+                data=attrs,
+                context={'request': request})
             serializer.is_valid(raise_exception=True)
-            instance = serializer.save()
+            serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if 'recipe' in attrs:
-            get_object_or_404(Recipe, pk=data['recipe'])
+        if delete_if_present(model, user=request.user.id, **attrs):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        for name, value in attrs.items():
+            get_object_or_404(model._meta.get_field(name).related_model,
+                              pk=value)
+        return Response(
+            {"errors": err_msg},
+            status=status.HTTP_400_BAD_REQUEST)
+
+    @transaction.atomic
+    def process_bulk_request(self, request, model=None, field=None,
+                             unique_msg="", err_msg="", rejected=None):
+        """Метод класса, отвечающий за обработку пакетных POST и DELETE
+        запросов.
+
+        Принимает список id объектов поля field модели из тела запроса
+        и добавляет или удаляет все связи пакетом запросов в одной
+        транзакции. Для каждого id возвращает код ответа аналогичного
+        одиночного запроса и сообщение об ошибке. Словарь rejected
+        задаёт id объектов, которые нельзя добавить, и сообщения об
+        ошибке для них.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        found = set(
+            model._meta.get_field(field).related_model.objects.filter(
+                pk__in=ids
+            ).values_list('pk', flat=True)
+        )
+        errors = {
+            pk: (status.HTTP_404_NOT_FOUND, exceptions.NotFound.default_detail)
+            for pk in ids if pk not in found
+        }
+        if request.method == "POST":
+            errors.update(
+                (pk, (status.HTTP_400_BAD_REQUEST, message))
+                for pk, message in (rejected or {}).items() if pk in found
+            )
+            changed = bulk_insert_if_absent(
+                model, request.user.id, field,
+                [pk for pk in ids if pk not in errors])
+            success, message = status.HTTP_201_CREATED, unique_msg
+        else:
+            changed = bulk_delete_if_present(
+                model, request.user.id, field,
+                [pk for pk in ids if pk in found])
+            success, message = status.HTTP_204_NO_CONTENT, err_msg
+
+        results = []
+        for pk in ids:
+            if pk in changed:
+                results.append({'id': pk, 'status': success})
+                continue
+            code, error = errors.get(
+                pk, (status.HTTP_400_BAD_REQUEST, message))
+            results.append({'id': pk, 'status': code, 'errors': error})
+        return Response({'results': results})
+
+
+class ConditionalGetMixin:
+    """Миксин для поддержки условных GET запросов.
+
+    Добавляет к ответам на запросы list и retrieve заголовки ETag и
+    Last-Modified и возвращает ответ 304 без вызова сериализаторов, если
+    данные клиента актуальны. Значения валидаторов возвращает метод
+    get_validators(request, *args, **kwargs) класса-наследника в виде
+    пары (etag, last_modified); он не должен рендерить ответ.
+    """
+
+    @staticmethod
+    def make_etag(*parts):
+        """Метод для формирования ETag из набора значений."""
+        return md5(
+            ':'.join(str(part) for part in parts).encode()
+        ).hexdigest()
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        """Метод для формирования ответа с учётом валидаторов запроса."""
+        etag, last_modified = self.get_validators(request, *args, **kwargs)
+        if etag is not None:
+            etag = quote_etag(etag)
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(request, etag=etag,
+                                            last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            if etag is not None and not response.has_header('ETag'):
+                response['ETag'] = etag
+            if (last_modified is not None
+                    and not response.has_header('Last-Modified')):
+                response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request,
+                                         *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request,
+                                         *args, **kwargs)
+
+
+class CatalogSnapshotMixin:
+    """Миксин для ответа на GET запросы к справочникам.
+
+    Отдаёт заранее отрендеренные данные из снимка catalog_snapshot без
+    обращения к базе данных. Поддерживает фильтрацию по начальным символам
+    через параметр snapshot_filter_param. Запросы с другими параметрами
+    или форматами обрабатываются стандартными методами вьюсета.
+    """
+
+    catalog_snapshot = None
+    snapshot_filter_param = None
+
+    def get_validators(self, request, *args, **kwargs):
+        """Метод для получения валидаторов условного запроса.
+
+        Значения определяются версией справочника и форматом ответа.
+        """
+        model = self.catalog_snapshot.model
+        etag = ConditionalGetMixin.make_etag(
+            get_catalog_version(model), request.accepted_renderer.format)
+        return etag, get_catalog_last_modified(model)
+
+    def can_use_snapshot(self, request):
+        """Метод для проверки возможности ответа из снимка."""
+        params = set(request.query_params) - {self.snapshot_filter_param}
+        return (not params
+                and request.accepted_renderer.format == 'json')
 
-        instance = model.objects.filter(**data)
-        if not instance.exists():
-            return Response(
-                {"errors": err_msg},
-                status=status.HTTP_400_BAD_REQUEST)
+    def list(self, request, *args, **kwargs):
+        if not self.can_use_snapshot(request):
+            return super().list(request, *args, **kwargs)
+        prefix = request.query_params.get(self.snapshot_filter_param)
+        content = self.catalog_snapshot.filter_startswith(prefix)
+        return HttpResponse(content, content_type='application/json')
 
-        instance.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs.get(self.lookup_url_kwarg or self.lookup_field, '')
+        content = None
+        if self.can_use_snapshot(request) and str(pk).isdigit():
+            content = self.catalog_snapshot.get_item(int(pk))
+        if content is None:
+            return super().retrieve(request, *args, **kwargs)
+        return HttpResponse(content, content_type='application/json')
@@ -1,5 +1,93 @@
+import base64
+import json
+from functools import partial
+from hashlib import md5
+
 from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.utils import (get_count_version, get_estimated_count,
+                           get_planner_estimate)
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор с кэшируемым подсчётом общего числа объектов.
+
+    Число объектов хранится в общем кэше по ключу count_key. Если
+    планировщик PostgreSQL оценивает выборку не меньше чем в
+    ESTIMATED_COUNT_THRESHOLD строк, вместо точного подсчёта
+    используется эта оценка, а count_exact становится False.
+
+    Кэшированное и приближённое число может отличаться от фактического,
+    поэтому страница выбирается без ограничения этим числом.
+    """
+
+    def __init__(self, object_list, per_page, count_key=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+        self.count_exact = True
+        self.count_stale = False
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if self.count_stale and int(number) > 1:
+                return int(number)
+            raise
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self)
+
+    def is_large_table(self):
+        """Метод для проверки, может ли выборка превысить порог оценки.
+
+        Оценка числа строк всей таблицы кэшируется, чтобы для небольших
+        таблиц не выполнять EXPLAIN при каждом новом наборе фильтров.
+        """
+        if not hasattr(self.object_list, 'query'):
+            return False
+        model = self.object_list.model
+        key = f'table_rows:{model._meta.label_lower}'
+        rows = cache.get(key)
+        if rows is None:
+            rows = get_estimated_count(model) or 0
+            cache.set(key, rows, timeout=settings.COUNT_CACHE_TIMEOUT)
+        return rows >= settings.ESTIMATED_COUNT_THRESHOLD
+
+    @cached_property
+    def count(self):
+        if self.count_key is not None:
+            cached = cache.get(self.count_key)
+            if cached is not None:
+                count, self.count_exact = cached
+                self.count_stale = True
+                return count
+
+        estimate = None
+        if self.is_large_table():
+            estimate = get_planner_estimate(self.object_list)
+        if (estimate is not None
+                and estimate >= settings.ESTIMATED_COUNT_THRESHOLD):
+            count, self.count_exact = estimate, False
+            self.count_stale = True
+        else:
+            count = self.object_list.count()
+
+        if self.count_key is not None:
+            cache.set(self.count_key, (count, self.count_exact),
+                      timeout=settings.COUNT_CACHE_TIMEOUT)
+        return count
 
 
 class PageAndLimitPagination(PageNumberPagination):
@@ -8,7 +96,135 @@ class PageAndLimitPagination(PageNumberPagination):
     Устанавливает лимит объектов в ответе на запрос и
     добавляет параметр ограничения количества объектов
     в запросе.
+
+    При наличии в запросе параметра cursor (пустого для первой страницы)
+    включается курсорная пагинация по полям cursor_ordering вьюсета:
+    страницы выбираются условием по значениям полей последнего объекта
+    предыдущей страницы, без OFFSET и подсчёта общего числа объектов.
+    Курсор не хранит других полей сортировки, поэтому вместе с
+    параметрами cursor_conflicting_params, меняющими порядок объектов,
+    запрос отклоняется с ошибкой валидации.
+
+    Общее число объектов постраничного ответа кэшируется по набору
+    параметров фильтрации и сбрасывается сменой версии данных модели.
+    Фильтры count_user_params вьюсета, а также действия с
+    count_per_user=True зависят от пользователя и учитывают
+    его версию данных.
     """
 
     page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
     page_size_query_param = settings.PAGE_SIZE_QUERY_PARAM
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+    cursor_conflicting_params = ('ordering', 'search')
+    cursor_conflict_message = (
+        'Курсорная пагинация не поддерживает параметры: {params}.')
+    count_ignored_params = ('page', 'limit', 'cursor', 'ordering',
+                            'recipes_limit', 'format')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            self.django_paginator_class = partial(
+                CachedCountPaginator,
+                count_key=self.get_count_key(queryset, request, view))
+            return super().paginate_queryset(queryset, request, view)
+
+        conflicting = [
+            name for name in self.cursor_conflicting_params
+            if request.query_params.get(name)
+        ]
+        if conflicting:
+            raise ValidationError({self.cursor_query_param: [
+                self.cursor_conflict_message.format(
+                    params=', '.join(conflicting))
+            ]})
+        self.request = request
+        self.ordering = getattr(view, 'cursor_ordering', ('-id',))
+        page_size = self.get_page_size(request)
+        cursor = request.query_params[self.cursor_query_param]
+        queryset = queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(
+                self.get_cursor_filter(queryset.model, cursor))
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        return self.page
+
+    def get_count_key(self, queryset, request, view):
+        """Метод для получения ключа кэша общего числа объектов."""
+        params = sorted(
+            (name, sorted(request.query_params.getlist(name)))
+            for name in request.query_params
+            if name not in self.count_ignored_params
+        )
+        model = queryset.model
+        versions = [get_count_version(model)]
+        user_params = getattr(view, 'count_user_params', ())
+        if (request.user.is_authenticated
+                and (getattr(view, 'count_per_user', False)
+                     or any(name in user_params for name, _ in params))):
+            versions += [request.user.id,
+                         get_count_version(model, request.user.id)]
+        signature = md5(repr((getattr(view, 'action', None), params,
+                              versions)).encode()).hexdigest()
+        return f'page_count:{model._meta.label_lower}:{signature}'
+
+    def get_ordering_fields(self):
+        """Метод для получения полей сортировки и их направления."""
+        return [
+            (field.lstrip('-'), field.startswith('-'))
+            for field in self.ordering
+        ]
+
+    def encode_cursor(self, obj):
+        """Метод для кодирования значений полей объекта в курсор."""
+        values = [
+            str(getattr(obj, field)) for field, _ in self.get_ordering_fields()
+        ]
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode()).decode()
+
+    def get_cursor_filter(self, model, cursor):
+        """Метод для построения условия выборки следующей страницы."""
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            fields = self.get_ordering_fields()
+            if len(values) != len(fields):
+                raise ValueError
+            values = [
+                model._meta.get_field(field).to_python(value)
+                for (field, _), value in zip(fields, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+        condition = Q()
+        for index, (field, descending) in enumerate(fields):
+            lookup = f'{field}__{"lt" if descending else "gt"}'
+            equal = {
+                name: value
+                for (name, _), value in zip(fields[:index], values)
+            }
+            condition |= Q(**{lookup: values[index]}, **equal)
+        return condition
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.cursor_query_param,
+                                   self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            response = super().get_paginated_response(data)
+            response.data['count_exact'] = self.page.paginator.count_exact
+            return response
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
@@ -0,0 +1,195 @@
+import json
+import logging
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """Класс метрик производительности одного запроса.
+
+    Накапливает число SQL запросов, время работы базы данных,
+    время именованных участков обработки запроса и метки запроса.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = {}
+        self.labels = {}
+        self.depth = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка выполнения SQL запросов для execute_wrapper."""
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - started
+            self.queries += 1
+
+    @contextmanager
+    def measure(self, name):
+        """Контекстный менеджер учёта времени участка name.
+
+        Вложенные участки не учитываются повторно, чтобы время
+        сериализатора внутри другого сериализатора не суммировалось.
+        """
+        depth = self.depth.get(name, 0)
+        self.depth[name] = depth + 1
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.depth[name] = depth
+            if not depth:
+                self.add_timing(name, perf_counter() - started)
+
+    def add_timing(self, name, duration):
+        """Метод добавления времени участка name."""
+        self.timings[name] = self.timings.get(name, 0.0) + duration
+
+
+@contextmanager
+def measure(name):
+    """Функция учёта времени участка name в метриках текущего запроса.
+
+    Вне запроса, например в management командах, ничего не делает.
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    with metrics.measure(name):
+        yield
+
+
+def set_label(name, value):
+    """Функция добавления метки в метрики текущего запроса."""
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.labels[name] = value
+
+
+def get_query_budget(view_func, method):
+    """Функция получения бюджета SQL запросов для представления.
+
+    Бюджет задаётся атрибутом query_budget класса представления:
+    числом для всех действий или словарём по именам действий вьюсета.
+    Если бюджет для действия не задан, используется QUERY_BUDGET.
+    Для представлений вне DRF, например админки, бюджет не проверяется.
+    """
+    view_cls = getattr(view_func, 'cls', None)
+    if view_cls is None:
+        return None
+    budget = getattr(view_cls, 'query_budget', None)
+    if isinstance(budget, dict):
+        actions = getattr(view_func, 'actions', None) or {}
+        budget = budget.get(actions.get(method.lower()))
+    return settings.QUERY_BUDGET if budget is None else budget
+
+
+class PerformanceMiddleware:
+    """Промежуточный слой измерения производительности запросов.
+
+    Считает SQL запросы и время базы данных через execute_wrapper
+    без включения DEBUG, добавляет в ответ заголовок Server-Timing,
+    пишет структурированную строку в лог и предупреждает о превышении
+    бюджета SQL запросов представления.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        started = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        total = perf_counter() - started
+
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = self.get_server_timing(
+                metrics, total)
+        self.log(request, response, metrics, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Метод определения бюджета SQL запросов представления."""
+        request.query_budget = get_query_budget(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        """Метод учёта времени рендеринга ответов DRF."""
+        metrics = current_metrics.get()
+        started = perf_counter()
+
+        def rendered(response):
+            metrics.add_timing('render', perf_counter() - started)
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def get_server_timing(metrics, total):
+        """Метод формирования значения заголовка Server-Timing."""
+        entries = [
+            f'db;dur={metrics.db_time * 1000:.1f};'
+            f'desc="{metrics.queries} queries"',
+        ]
+        entries.extend(
+            f'{name};dur={duration * 1000:.1f}'
+            for name, duration in metrics.timings.items()
+        )
+        entries.extend(
+            f'{name};desc="{value}"'
+            for name, value in metrics.labels.items()
+        )
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+    @staticmethod
+    def log(request, response, metrics, total):
+        """Метод записи метрик запроса в лог.
+
+        При превышении бюджета SQL запросов строка пишется с уровнем
+        WARNING, иначе с уровнем INFO.
+        """
+        budget = getattr(request, 'query_budget', None)
+        over_budget = budget is not None and metrics.queries > budget
+        level = logging.WARNING if over_budget else logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'query_budget': budget,
+            'db_ms': round(metrics.db_time * 1000, 1),
+            **{
+                f'{name}_ms': round(duration * 1000, 1)
+                for name, duration in metrics.timings.items()
+            },
+            'total_ms': round(total * 1000, 1),
+            **metrics.labels,
+        }
+        if over_budget:
+            logger.warning('query budget exceeded %s',
+                           json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info('request %s', json.dumps(record, ensure_ascii=False))
@@ -0,0 +1,146 @@
+import csv
+import os
+from tempfile import SpooledTemporaryFile
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class EchoBuffer:
+    """Класс буфера, возвращающего записанную строку без хранения."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListNegotiation(DefaultContentNegotiation):
+    """Класс выбора формата списка покупок.
+
+    Если заголовок Accept не совпадает ни с одним из форматов,
+    используется первый рендерер из списка.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Родительский класс рендерера списка покупок.
+
+    Список покупок формируется построчно из итератора кортежей
+    (название, единица измерения, количество) и отдаётся потоковым
+    ответом. Ответы с ошибками рендерятся в JSON.
+    """
+
+    charset = 'utf-8'
+    filename = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+    def render_rows(self, ingredients):
+        """Метод-генератор строк файла списка покупок."""
+        raise NotImplementedError
+
+    def get_response(self, ingredients):
+        """Метод для формирования ответа с файлом списка покупок."""
+        response = StreamingHttpResponse(
+            self.render_rows(ingredients),
+            content_type=f'{self.media_type}; charset={self.charset}'
+        )
+        response['Content-Disposition'] = (
+            f"attachment; filename*=utf-8''{quote(self.filename)}")
+        return response
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    """Рендерер списка покупок в текстовый файл."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+    filename = 'Список покупок.txt'
+
+    def render_rows(self, ingredients):
+        for name, measurement_unit, total in ingredients:
+            yield f'{name} - {total} ({measurement_unit})\n'
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    """Рендерер списка покупок в файл формата csv."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+    filename = 'Список покупок.csv'
+
+    def render_rows(self, ingredients):
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(('Ингредиент', 'Единица измерения',
+                               'Количество'))
+        for row in ingredients:
+            yield writer.writerow(row)
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    """Рендерер списка покупок в файл формата pdf.
+
+    Документ рисуется напрямую на холсте reportlab без построения
+    промежуточной разметки и записывается во временный файл, который
+    переносится на диск при превышении SHOPPING_LIST_PDF_MEMORY_LIMIT.
+    """
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    filename = 'Список покупок.pdf'
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    margin = 50
+    line_height = 18
+
+    def get_font(self):
+        """Метод для регистрации шрифта с поддержкой кириллицы."""
+        font_path = settings.SHOPPING_LIST_PDF_FONT
+        if font_path is None or not os.path.isfile(font_path):
+            return 'Helvetica'
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(self.font_name, font_path))
+        return self.font_name
+
+    def render_file(self, ingredients):
+        """Метод для записи списка покупок во временный файл pdf."""
+        buffer = SpooledTemporaryFile(
+            max_size=settings.SHOPPING_LIST_PDF_MEMORY_LIMIT)
+        font = self.get_font()
+        width, height = A4
+        pdf = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+        pdf.setTitle('Список покупок')
+        pdf.setFont(font, self.font_size)
+        position = height - self.margin
+        for name, measurement_unit, total in ingredients:
+            if position < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                position = height - self.margin
+            pdf.drawString(self.margin, position,
+                           f'{name} - {total} ({measurement_unit})')
+            position -= self.line_height
+        pdf.save()
+        buffer.seek(0)
+        return buffer
+
+    def get_response(self, ingredients):
+        return FileResponse(self.render_file(ingredients),
+                            content_type=self.media_type,
+                            as_attachment=True,
+                            filename=self.filename)
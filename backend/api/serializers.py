@@ -1,20 +1,65 @@
 from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
-from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
+from rest_framework import exceptions, serializers
 
+from api.mixins import InsertIfAbsentMixin, TimedSerializerMixin
+from recipes.images import get_derivative_names
 from recipes.models import (Favourites, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, Tag)
 from users.models import Follow
 
 User = get_user_model()
 
 
-class FoodgramUserCreateSerializer(UserCreateSerializer):
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """Класс-сериализатор списка с учётом времени сериализации."""
+
+
+class ImageDerivativesField(serializers.Field):
+    """Класс поля ссылок на производные изображения рецепта.
+
+    Возвращает ссылки по вариантам и форматам изображения. Пока
+    производные изображения не созданы, все ссылки ведут на исходный
+    файл.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        storage = recipe.image.storage
+        request = self.context.get('request')
+
+        def get_url(name):
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request else url
+
+        names = get_derivative_names(recipe.image.name)
+        if not recipe.image_derivatives:
+            original = get_url(recipe.image.name)
+            return {
+                variant: {image_format: original for image_format in formats}
+                for variant, formats in names.items()
+            }
+        return {
+            variant: {
+                image_format: get_url(name)
+                for image_format, name in formats.items()
+            }
+            for variant, formats in names.items()
+        }
+
+
+class FoodgramUserCreateSerializer(TimedSerializerMixin, UserCreateSerializer):
     """Класс-сериализатор для создания модели MyUser."""
 
     class Meta:
@@ -25,7 +70,7 @@ class FoodgramUserCreateSerializer(UserCreateSerializer):
                   'password')
 
 
-class FoodgramUserSerializer(UserSerializer):
+class FoodgramUserSerializer(TimedSerializerMixin, UserSerializer):
     """Класс-сериализатор для чтения модели MyUser."""
 
     is_subscribed = serializers.SerializerMethodField()
@@ -34,55 +79,104 @@ class FoodgramUserSerializer(UserSerializer):
         """Класс Meta сериализатора."""
 
         model = User
+        list_serializer_class = TimedListSerializer
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
                   'is_subscribed')
 
-    def get_is_subscribed(self, obj):
-        """Возвращает True, если автор запроса подписан на пользователя obj."""
+    def get_followed_ids(self):
+        """Возвращает множество id пользователей, на которых подписан автор
+        запроса.
+
+        Множество вычисляется один раз за запрос и сохраняется в объекте
+        request, поэтому вложенные сериализаторы используют его повторно.
+        """
         request = self.context['request']
-        return (request is not None and request.user.is_authenticated
-                and obj.following.filter(user=request.user).exists())
+        followed_ids = getattr(request, 'followed_ids', None)
+        if followed_ids is None:
+            followed_ids = set(
+                Follow.objects.filter(
+                    user=request.user
+                ).values_list('following_id', flat=True)
+            )
+            request.followed_ids = followed_ids
+        return followed_ids
+
+    def get_is_subscribed(self, obj):
+        """Возвращает True, если автор запроса подписан на пользователя obj.
+
+        Если значение уже было вычислено аннотацией запроса, повторное
+        обращение к базе данных не выполняется.
+        """
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return False
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
+        return obj.id in self.get_followed_ids()
 
 
 class ReadFollowSerializer(FoodgramUserSerializer):
     """Класс-сериализатор для возврата ответа на запрос к модели Follow."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source='recipes.count')
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         """Класс Meta сериализатора."""
 
         model = User
+        list_serializer_class = TimedListSerializer
         fields = FoodgramUserSerializer.Meta.fields + ('recipes',
                                                        'recipes_count')
 
     def get_recipes(self, obj):
-        """Метод для получения значения поля repices."""
-        queryset = Recipe.objects.filter(author=obj)
-        request = self.context['request']
-        recipes_limit = request.query_params.get('recipes_limit')
-        if recipes_limit and recipes_limit.isdigit():
-            queryset = queryset[:int(recipes_limit)]
+        """Метод для получения значения поля repices.
+
+        Использует рецепты, заранее загруженные во вьюсете, если они есть.
+        """
+        queryset = getattr(obj, 'page_recipes', None)
+        if queryset is None:
+            queryset = Recipe.objects.filter(author=obj)
+            request = self.context['request']
+            recipes_limit = request.query_params.get('recipes_limit')
+            if recipes_limit and recipes_limit.isdigit():
+                queryset = queryset[:int(recipes_limit)]
         serializer = UsersRecipeSerializer(queryset, many=True)
 
         return serializer.data
 
 
-class WriteFollowSerializer(serializers.ModelSerializer):
+class FollowingField(serializers.PrimaryKeyRelatedField):
+    """Класс поля пользователя, на которого оформляется подписка.
+
+    Если пользователя нет, вызывается NotFound, поэтому запрос подписки
+    возвращает 404 без отдельной проверки существования пользователя.
+    """
+
+    def to_internal_value(self, data):
+        try:
+            return self.get_queryset().get(pk=data)
+        except ObjectDoesNotExist:
+            raise exceptions.NotFound()
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class WriteFollowSerializer(TimedSerializerMixin, InsertIfAbsentMixin,
+                            serializers.ModelSerializer):
     """Класс-сериализатор для записи в модель Follow."""
 
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    following = FollowingField(queryset=User.objects.all())
+    unique_message = 'Подписка на этого пользователя уже оформлена'
+    self_follow_message = 'Нельзя подписаться на себя.'
+
     class Meta:
         """Класс Meta сериализатора."""
 
         model = Follow
         fields = ('user', 'following')
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Follow.objects.all(),
-                fields=('user', 'following'),
-                message='Подписка на этого пользователя уже оформлена')
-        ]
 
     def validate(self, data):
         """Валидатор поля following сериализатора.
@@ -90,12 +184,13 @@ class WriteFollowSerializer(serializers.ModelSerializer):
         Вызывает ValidationError, если пользователь пытается подписаться
         на самого себя.
         """
-        if self.context['request'].user == data['following']:
-            raise serializers.ValidationError('Нельзя подписаться на себя.')
+        if data['user'] == data['following']:
+            raise serializers.ValidationError(self.self_follow_message)
         return data
 
     def to_representation(self, instance):
         """Метод для переопределения полей ответа на запрос."""
+        instance.following.is_subscribed = True
         return ReadFollowSerializer(instance=instance.following,
                                     context=self.context).data
 
@@ -137,36 +232,41 @@ class FoodgramAuthSerializer(serializers.Serializer):
         return attrs
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Класс-сериализатор для модели Tag."""
 
     class Meta:
         """Класс Meta сериализатора."""
 
         model = Tag
+        list_serializer_class = TimedListSerializer
         fields = ('id', 'name', 'color', 'slug')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Класс-сериализатор для модели Ingredient."""
 
     class Meta:
         """Класс Meta сериализатора."""
 
         model = Ingredient
+        list_serializer_class = TimedListSerializer
         fields = ('id', 'name', 'measurement_unit')
 
 
 class WriteIngredientRecipeSerializer(serializers.ModelSerializer):
     """Класс-сериализатор для записи в модель RecipeIngredient."""
 
-    id = serializers.PrimaryKeyRelatedField(source='ingredient',
-                                            queryset=Ingredient.objects.all())
+    id = serializers.IntegerField(source='ingredient')
     amount = serializers.IntegerField(
         min_value=settings.RECIPE_INGREDIENT_MIN_AMOUNT)
 
     class Meta:
-        """Класс Meta сериализатора."""
+        """Класс Meta сериализатора.
+
+        Существование ингредиентов проверяется одним запросом
+        в WriteRecipeSerializer.
+        """
 
         model = RecipeIngredient
         fields = ('id', 'amount')
@@ -194,12 +294,11 @@ class GetIngredientRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class WriteRecipeSerializer(serializers.ModelSerializer):
+class WriteRecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Класс-сериализатор для записи в модель Recipe."""
 
     author = FoodgramUserSerializer(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(many=True,
-                                              queryset=Tag.objects.all())
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = Base64ImageField()
     ingredients = WriteIngredientRecipeSerializer(many=True)
     cooking_time = serializers.IntegerField(required=True, min_value=1)
@@ -213,30 +312,125 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
 
     @transaction.atomic
     def db_workout(self, instance, validated_data):
-        """Метод для создания и обновления модели Recipe."""
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
+        """Метод для создания и обновления модели Recipe.
+
+        При обновлении сохраняются только переданные поля рецепта,
+        чтобы не перезаписать счётчики, изменённые параллельными
+        запросами, а тэги и ингредиенты изменяются лишь в отличающейся
+        части. Не переданные в запросе PATCH поля не затрагиваются.
+        """
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
 
         if instance is None:
             validated_data['author'] = self.context['request'].user
             instance = Recipe.objects.create(**validated_data)
-        else:
-            RecipeIngredient.objects.filter(recipe=instance).all().delete()
-            super().update(instance=instance, validated_data=validated_data)
-
-        instance.tags.clear()
-        instance.tags.set(tags)
-
-        RecipeIngredient.objects.bulk_create(
-            RecipeIngredient(
-                recipe=instance,
-                ingredient=ingredient['ingredient'],
-                amount=ingredient['amount'],
-            ) for ingredient in ingredients
-        )
+            instance.tags.add(*tags)
+            self.related_objects = {
+                'tags': tags,
+                'recipe_ingredients': RecipeIngredient.objects.bulk_create(
+                    RecipeIngredient(
+                        recipe=instance,
+                        ingredient=ingredient['ingredient'],
+                        amount=ingredient['amount'],
+                    ) for ingredient in ingredients
+                ),
+            }
+            return instance
+
+        self.related_objects = {
+            name: list(queryset) for name, queryset in getattr(
+                instance, '_prefetched_objects_cache', {}).items()
+            if name in ('tags', 'recipe_ingredients')
+        }
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=(*validated_data, 'updated_at'))
+        if tags is not None:
+            instance.tags.set(tags)
+            self.related_objects['tags'] = tags
+        if ingredients is not None:
+            self.related_objects['recipe_ingredients'] = (
+                self.update_ingredients(
+                    instance, ingredients,
+                    self.related_objects.get('recipe_ingredients'))
+            )
 
         return instance
 
+    @staticmethod
+    def set_prefetched(instance, name, objects):
+        """Метод для сохранения связанных объектов в кэше предвыборки.
+
+        Позволяет ReadRecipeSerializer построить ответ по уже известным
+        тэгам и ингредиентам без повторных запросов к базе данных.
+        """
+        queryset = getattr(instance, name).all()
+        queryset._result_cache = list(objects)
+        queryset._prefetch_done = True
+        if not hasattr(instance, '_prefetched_objects_cache'):
+            instance._prefetched_objects_cache = {}
+        instance._prefetched_objects_cache[name] = queryset
+
+    @staticmethod
+    def update_ingredients(instance, ingredients, current=None):
+        """Метод для применения изменений ингредиентов рецепта.
+
+        Удаляет, добавляет и изменяет количество только тех ингредиентов,
+        которые отличаются от сохранённых в current (или в базе данных),
+        и учитывает изменения в списках покупок. Возвращает ингредиенты
+        рецепта в порядке их передачи в запросе.
+        """
+        if current is None:
+            current = RecipeIngredient.objects.filter(recipe=instance)
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in current
+        }
+        old_amounts = {
+            ingredient_id: recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in current.items()
+        }
+        new_amounts = {
+            ingredient['ingredient'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        new_ingredients = {
+            ingredient['ingredient'].id: ingredient['ingredient']
+            for ingredient in ingredients
+        }
+
+        removed = current.keys() - new_amounts.keys()
+        if removed:
+            with ShoppingListItem.untracked():
+                RecipeIngredient.objects.filter(
+                    recipe=instance, ingredient_id__in=removed).delete()
+        created = RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=instance,
+                             ingredient=new_ingredients[ingredient_id],
+                             amount=new_amounts[ingredient_id])
+            for ingredient_id in new_amounts.keys() - current.keys()
+        )
+        changed = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = new_amounts.get(ingredient_id)
+            if amount is None:
+                continue
+            recipe_ingredient.ingredient = new_ingredients[ingredient_id]
+            if amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+
+        ShoppingListItem.update_recipe(instance.id, old_amounts, new_amounts)
+
+        result = {**current, **{
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in created
+        }}
+        return [result[ingredient_id] for ingredient_id in new_amounts]
+
     def create(self, validated_data):
         """Хук-метод для создания модели Recipe."""
         recipe = self.db_workout(None, validated_data)
@@ -250,42 +444,86 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
         return instance
 
     def to_representation(self, instance):
-        """Метод для переопределения полей ответа на запрос."""
+        """Метод для переопределения полей ответа на запрос.
+
+        Тэги и ингредиенты, известные после записи рецепта, передаются
+        в ответ без повторного чтения из базы данных.
+        """
+        for name, objects in getattr(self, 'related_objects', {}).items():
+            self.set_prefetched(instance, name, objects)
         return ReadRecipeSerializer(instance, context=self.context).data
 
-    def validate(self, data):
-        """Метод для валидации содержимого полей перед созданием рецепта."""
-        image = data.get('image')
-        if not image:
-            raise serializers.ValidationError(
-                'Отсутствует фото'
-            )
+    @staticmethod
+    def get_objects(model, ids, message):
+        """Метод для получения объектов модели по списку id одним запросом.
 
-        ingredients = data.get('ingredients')
-        if not ingredients:
+        Если часть объектов не найдена, все отсутствующие id
+        перечисляются в одной ошибке валидации.
+        """
+        objects = model.objects.in_bulk(ids)
+        missing = sorted(set(ids) - objects.keys())
+        if missing:
             raise serializers.ValidationError(
-                'Минимальное число ингредиентов: 1'
-            )
+                message.format(', '.join(map(str, missing))))
+        return objects
+
+    def validate_ingredients(self, value):
+        """Метод для получения ингредиентов рецепта по их id."""
+        ingredients = self.get_objects(
+            Ingredient,
+            [ingredient['ingredient'] for ingredient in value],
+            'Ингредиенты не существуют: {}.'
+        )
+        for ingredient in value:
+            ingredient['ingredient'] = ingredients[ingredient['ingredient']]
+        return value
 
-        ingredients_ids = [
-            ingredient['ingredient'].id for ingredient in ingredients]
-        if len(ingredients_ids) != len(set(ingredients_ids)):
-            raise serializers.ValidationError(
-                'Этот ингредиент уже добавлен.'
-            )
+    def validate_tags(self, value):
+        """Метод для получения тэгов рецепта по их id.
 
-        tags = data.get('tags')
-        if not tags:
-            raise serializers.ValidationError(
-                'Минимальное число тегов: 1'
-            )
-        if len(tags) != len(set(tags)):
-            raise serializers.ValidationError('Этот тег уже добавлен.')
+        Тэги упорядочиваются так же, как при чтении рецепта.
+        """
+        tags = self.get_objects(Tag, value, 'Тэги не существуют: {}.')
+        return sorted((tags[tag_id] for tag_id in value),
+                      key=lambda tag: tag.name)
+
+    def validate(self, data):
+        """Метод для валидации содержимого полей перед созданием рецепта.
+
+        При частичном обновлении проверяются только переданные поля.
+        """
+        if not self.partial or 'image' in data:
+            if not data.get('image'):
+                raise serializers.ValidationError(
+                    'Отсутствует фото'
+                )
+
+        if not self.partial or 'ingredients' in data:
+            ingredients = data.get('ingredients')
+            if not ingredients:
+                raise serializers.ValidationError(
+                    'Минимальное число ингредиентов: 1'
+                )
+            ingredients_ids = [
+                ingredient['ingredient'].id for ingredient in ingredients]
+            if len(ingredients_ids) != len(set(ingredients_ids)):
+                raise serializers.ValidationError(
+                    'Этот ингредиент уже добавлен.'
+                )
+
+        if not self.partial or 'tags' in data:
+            tags = data.get('tags')
+            if not tags:
+                raise serializers.ValidationError(
+                    'Минимальное число тегов: 1'
+                )
+            if len(tags) != len(set(tags)):
+                raise serializers.ValidationError('Этот тег уже добавлен.')
 
         return data
 
 
-class ReadRecipeSerializer(serializers.ModelSerializer):
+class ReadRecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Класс-сериализатор для возврата ответа на запрос к модели Recipe."""
 
     author = FoodgramUserSerializer(read_only=True)
@@ -295,39 +533,44 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.BooleanField(
         read_only=True,
         default=False)
+    favorites_count = serializers.IntegerField(source='favourites_count',
+                                               read_only=True)
+    images = ImageDerivativesField()
 
     class Meta:
         """Класс Meta сериализатора."""
 
         model = Recipe
+        list_serializer_class = TimedListSerializer
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'images', 'text',
+                  'cooking_time', 'favorites_count')
         depth = 1
 
+    def to_representation(self, instance):
+        """Метод для передачи аннотированной подписки на автора рецепта."""
+        author_is_subscribed = getattr(instance, 'author_is_subscribed', None)
+        if author_is_subscribed is not None:
+            instance.author.is_subscribed = author_is_subscribed
+        return super().to_representation(instance)
+
 
-class BaseFavouriteCartSerializer(serializers.ModelSerializer):
+class BaseFavouriteCartSerializer(TimedSerializerMixin, InsertIfAbsentMixin,
+                                  serializers.ModelSerializer):
     """Родительский класс сериализатора.
 
     Нужен в качестве миксина для сериализаторов моделейFavourites и
     ShoppingCart.
     """
 
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+
     class Meta:
         """Класс Meta сериализатора."""
 
         model = None
         fields = ('user', 'recipe')
 
-    def validate(self, data):
-        """Метод для валидации содержимого поля recipe."""
-        if not Recipe.objects.filter(pk=data['recipe'].id).exists():
-            raise serializers.ValidationError(
-                {"errors": (f'Рецепт с id {data["recipe"]} '
-                 'не существует')}
-            )
-        return data
-
     def to_representation(self, instance):
         """Метод для переопределения полей ответа на запрос."""
         return UsersRecipeSerializer(instance=instance.recipe,
@@ -337,42 +580,45 @@ class BaseFavouriteCartSerializer(serializers.ModelSerializer):
 class FavouritesSerializer(BaseFavouriteCartSerializer):
     """Класс-сериализатор для модели Favourites."""
 
+    unique_message = 'Рецепт уже в избранном'
+
     class Meta:
         """Класс Meta сериализатора."""
 
         model = Favourites
         fields = BaseFavouriteCartSerializer.Meta.fields
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Favourites.objects.all(),
-                fields=('user', 'recipe'),
-                message='Рецепт уже в избранном')
-        ]
 
 
 class ShoppingCartSerializer(BaseFavouriteCartSerializer):
     """Класс-сериализатор для модели ShoppingCart."""
 
+    unique_message = 'Рецепт уже в списке покупок'
+
     class Meta:
         """Класс Meta сериализатора."""
 
         model = ShoppingCart
         fields = BaseFavouriteCartSerializer.Meta.fields
-        validators = [
-            UniqueTogetherValidator(
-                queryset=ShoppingCart.objects.all(),
-                fields=('user', 'recipe'),
-                message='Рецепт уже в списке покупок')
-        ]
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Класс-сериализатор списка id для пакетных запросов."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_ACTION_MAX_ITEMS
+    )
 
 
 class UsersRecipeSerializer(serializers.ModelSerializer):
     """Cериализатор чтения рецептов для подписок, избранного и корзины."""
 
     image = Base64ImageField()
+    images = ImageDerivativesField()
 
     class Meta:
         """Класс Meta сериализатора."""
 
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
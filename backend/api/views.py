@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Exists, OuterRef, Sum
-from django.http import FileResponse
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Window
+from django.db.models.functions import RowNumber
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import viewsets
@@ -12,17 +12,22 @@ from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
+from api.catalog import ingredient_snapshot, tag_snapshot
 from api.filters import IngredientFilter, RecipesFilter
-from api.mixins import PostDeleteDBMixin
+from api.mixins import (CatalogSnapshotMixin, ConditionalGetMixin,
+                        PostDeleteDBMixin)
 from api.pagination import PageAndLimitPagination
 from api.permissions import IsAuthorOrReadOnly
-from api.serializers import (FavouritesSerializer, FoodgramAuthSerializer,
-                             IngredientSerializer, ReadFollowSerializer,
-                             ReadRecipeSerializer, ShoppingCartSerializer,
-                             TagSerializer, WriteFollowSerializer,
-                             WriteRecipeSerializer)
+from api.renderers import (ShoppingListCSVRenderer, ShoppingListNegotiation,
+                           ShoppingListPDFRenderer, ShoppingListTextRenderer)
+from api.serializers import (BulkIdsSerializer, FavouritesSerializer,
+                             FoodgramAuthSerializer, IngredientSerializer,
+                             ReadFollowSerializer, ReadRecipeSerializer,
+                             ShoppingCartSerializer, TagSerializer,
+                             WriteFollowSerializer, WriteRecipeSerializer)
 from recipes.models import (Favourites, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, Tag)
+from recipes.utils import get_catalog_version
 from users.models import Follow
 
 User = get_user_model()
@@ -48,6 +53,23 @@ class FoodgramUserViewSet(UserViewSet, PostDeleteDBMixin):
     Djoser и эндпоинты модели Follow.
     """
 
+    pagination_class = PageAndLimitPagination
+    cursor_ordering = ('username', 'id')
+    count_per_user = False
+    query_budget = {
+        'list': 6,
+        'retrieve': 4,
+        'me': 4,
+        'subscribe': 12,
+        'bulk_subscribe': 10,
+        'subscriptions': 6,
+    }
+
+    def get_serializer_class(self):
+        if self.action == 'bulk_subscribe':
+            return BulkIdsSerializer
+        return super().get_serializer_class()
+
     @action(["get", "put", "patch", "delete"],
             detail=False,
             permission_classes=[IsAuthenticated])
@@ -67,15 +89,28 @@ class FoodgramUserViewSet(UserViewSet, PostDeleteDBMixin):
             permission_classes=[IsAuthenticated])
     def subscribe(self, request, id=None):
         """Метод для обработки запросов создания и удаления подписки."""
-        get_object_or_404(User.objects.all(), id=id)
         data = {'following': id, }
         return self.process_request(request, Follow, WriteFollowSerializer,
                                     "Подписка на пользователя не оформлена",
                                     data)
 
-    @action(["get", ],
+    @action(["post", "delete"],
             detail=False,
             permission_classes=[IsAuthenticated])
+    def bulk_subscribe(self, request):
+        """Метод для обработки пакетных запросов создания и удаления
+        подписок.
+        """
+        return self.process_bulk_request(
+            request, Follow, 'following',
+            WriteFollowSerializer.unique_message,
+            "Подписка на пользователя не оформлена",
+            {request.user.id: WriteFollowSerializer.self_follow_message})
+
+    @action(["get", ],
+            detail=False,
+            permission_classes=[IsAuthenticated],
+            count_per_user=True)
     def subscriptions(self, request, *args, **kwargs):
         """Метод для обработки запроса списка действующих подписок."""
         user = request.user
@@ -84,34 +119,82 @@ class FoodgramUserViewSet(UserViewSet, PostDeleteDBMixin):
             .filter(following__user=user)
         )
         pages = self.paginate_queryset(queryset)
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes_limit = int(recipes_limit)
+        else:
+            recipes_limit = None
+        self.attach_recipes(pages, recipes_limit)
         serializer = ReadFollowSerializer(
             pages,
             many=True,
             context={'request': request, })
         return self.get_paginated_response(serializer.data)
 
+    @staticmethod
+    def attach_recipes(authors, recipes_limit=None):
+        """Метод для загрузки рецептов авторов страницы одним запросом.
+
+        При заданном recipes_limit для каждого автора выбираются последние
+        recipes_limit рецептов с помощью оконной функции ROW_NUMBER.
+        Рецепты сохраняются в атрибут page_recipes каждого автора.
+        """
+        authors_by_id = {author.id: author for author in authors}
+        for author in authors_by_id.values():
+            author.page_recipes = []
+        if not authors_by_id:
+            return
+        queryset = Recipe.objects.filter(
+            author__in=list(authors_by_id)
+        ).order_by('-pub_date', '-id')
+        if recipes_limit is not None:
+            sql, params = queryset.annotate(
+                recipe_rank=Window(
+                    expression=RowNumber(),
+                    partition_by=F('author'),
+                    order_by=(F('pub_date').desc(), F('id').desc())
+                )
+            ).query.sql_with_params()
+            queryset = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) ranked_recipes '
+                'WHERE ranked_recipes.recipe_rank <= %s '
+                'ORDER BY ranked_recipes.pub_date DESC, '
+                'ranked_recipes.id DESC',
+                params + (recipes_limit,)
+            )
+        for recipe in queryset:
+            authors_by_id[recipe.author_id].page_recipes.append(recipe)
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(ConditionalGetMixin, CatalogSnapshotMixin,
+                 viewsets.ReadOnlyModelViewSet):
     """Вьюсет для обработки GET запросов к модели Tag."""
 
+    catalog_snapshot = tag_snapshot
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [AllowAny]
     pagination_class = None
+    query_budget = 3
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, CatalogSnapshotMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """Вьюсет для обработки GET запросов к модели Ingredient."""
 
+    catalog_snapshot = ingredient_snapshot
+    snapshot_filter_param = 'name'
     queryset = Ingredient.objects.all()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     serializer_class = IngredientSerializer
     permission_classes = [AllowAny]
     pagination_class = None
+    query_budget = 3
 
 
-class RecipeViewSet(viewsets.ModelViewSet, PostDeleteDBMixin):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet,
+                    PostDeleteDBMixin):
     """Вьюсет для обработки запросовк модели Ingredient.
 
     Обрабатывает GET, POST, UPDATE и DELETE запросы.
@@ -121,17 +204,42 @@ class RecipeViewSet(viewsets.ModelViewSet, PostDeleteDBMixin):
     filterset_class = RecipesFilter
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
     pagination_class = PageAndLimitPagination
+    cursor_ordering = ('-pub_date', '-id')
+    count_user_params = ('is_favorited', 'is_in_shopping_cart')
+    # Бюджеты изменения и удаления рецепта равны числу запросов самого
+    # тяжёлого допустимого запроса: с холодным кэшем токена, заменой
+    # тэгов, изображения и ингредиентов рецепта из списков покупок.
+    # От числа ингредиентов, списков покупок и избранного оно не зависит.
+    query_budget = {
+        'list': 10,
+        'retrieve': 8,
+        'create': 14,
+        'update': 25,
+        'partial_update': 25,
+        'destroy': 21,
+        'favorite': 10,
+        'shopping_cart': 16,
+        'bulk_favorite': 10,
+        'bulk_shopping_cart': 16,
+        'download_shopping_cart': 6,
+    }
 
     def get_queryset(self):
         """Переопределение логики метода для аннотации полей.
 
-        Для авторизованных пользователей в сериализатор будут переданы
-        значения полей is_favorited и is_in_shopping_cart.
+        Связанные теги, ингредиенты и автор загружаются заранее, чтобы
+        число запросов не зависело от размера страницы. Для авторизованных
+        пользователей в сериализатор будут переданы значения полей
+        is_favorited, is_in_shopping_cart и подписки на автора.
         """
         queryset = Recipe.objects.select_related(
             'author'
         ).prefetch_related(
-            'ingredients'
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
         )
         if not self.request.user.is_authenticated:
             return queryset.all()
@@ -149,16 +257,75 @@ class RecipeViewSet(viewsets.ModelViewSet, PostDeleteDBMixin):
                         recipe=OuterRef('id'),
                         user=self.request.user
                     )
+                ),
+                author_is_subscribed=Exists(
+                    Follow.objects.filter(
+                        following=OuterRef('author'),
+                        user=self.request.user
+                    )
                 )
             ).all()
         )
 
+    def perform_destroy(self, instance):
+        """Метод для удаления рецепта.
+
+        Ингредиенты рецепта вычитаются из списков покупок одним вызовом
+        update_recipe по уже загруженным ингредиентам. Избранное
+        удаляется одним запросом без сигналов, которые уменьшали бы
+        счётчик удаляемого рецепта для каждой строки. Поэтому число
+        запросов не зависит от числа ингредиентов, списков покупок и
+        добавлений в избранное.
+        """
+        amounts = {
+            recipe_ingredient.ingredient_id: recipe_ingredient.amount
+            for recipe_ingredient in instance.recipe_ingredients.all()
+        }
+        favourites = Favourites.objects.filter(recipe=instance)
+        with transaction.atomic(), ShoppingListItem.untracked():
+            ShoppingListItem.update_recipe(instance.id, amounts, {})
+            favourites._raw_delete(favourites.db)
+            instance.delete()
+
+    def get_validators(self, request, *args, **kwargs):
+        """Метод для получения валидаторов условного запроса.
+
+        Для детального просмотра рецепта ETag вычисляется из даты изменения
+        рецепта, данных автора, версий справочников и, для авторизованных
+        пользователей, отметок избранного, списка покупок и подписки.
+        Last-Modified не передаётся: счётчик избранного, данные автора,
+        справочники и производные изображения меняются без изменения
+        даты рецепта, поэтому дата не подтверждает актуальность ответа.
+        """
+        pk = str(kwargs.get('pk'))
+        if self.action != 'retrieve' or not pk.isdigit():
+            return None, None
+        fields = ['updated_at', 'favourites_count', 'image_derivatives',
+                  'author__username', 'author__email', 'author__first_name',
+                  'author__last_name']
+        if request.user.is_authenticated:
+            fields += ['is_favorited', 'is_in_shopping_cart',
+                       'author_is_subscribed']
+        row = self.get_queryset().prefetch_related(None).filter(
+            pk=pk
+        ).values_list(*fields).first()
+        if row is None:
+            return None, None
+        etag = self.make_etag(request.user.id,
+                              request.accepted_renderer.format,
+                              get_catalog_version(Tag),
+                              get_catalog_version(Ingredient),
+                              *row)
+        return etag, None
+
     def get_serializer_class(self):
         """Переопределение метода для выбора сериализатора в зависимости от
         типа запроса.
         """
         if self.action in ['list', 'retrieve']:
             return ReadRecipeSerializer
+        if self.action in ['bulk_favorite', 'bulk_shopping_cart']:
+            return BulkIdsSerializer
 
         return WriteRecipeSerializer
 
@@ -186,37 +353,48 @@ class RecipeViewSet(viewsets.ModelViewSet, PostDeleteDBMixin):
                                     "Рецепт не находится в списке покупок",
                                     data)
 
+    @action(["post", "delete"],
+            detail=False,
+            permission_classes=[IsAuthenticated])
+    def bulk_favorite(self, request):
+        """Метод для обработки пакетных запросов к избранному."""
+        return self.process_bulk_request(
+            request, Favourites, 'recipe',
+            FavouritesSerializer.unique_message,
+            "Рецепт не находится в избранном")
+
+    @action(["post", "delete"],
+            detail=False,
+            permission_classes=[IsAuthenticated])
+    def bulk_shopping_cart(self, request):
+        """Метод для обработки пакетных запросов к списку покупок."""
+        return self.process_bulk_request(
+            request, ShoppingCart, 'recipe',
+            ShoppingCartSerializer.unique_message,
+            "Рецепт не находится в списке покупок")
+
     @action(
         methods=["GET"],
         detail=False,
-        permission_classes=[IsAuthenticated]
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[ShoppingListTextRenderer, ShoppingListCSVRenderer,
+                          ShoppingListPDFRenderer],
+        content_negotiation_class=ShoppingListNegotiation
     )
     def download_shopping_cart(self, request):
-        """Метод для обработки запроса получения списка покупок."""
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_carts__user=request.user
+        """Метод для обработки запроса получения списка покупок.
+
+        Формат файла выбирается параметром format: txt (по умолчанию),
+        csv или pdf. Строки читаются итератором из агрегированного
+        списка покупок пользователя.
+        """
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
         ).values_list(
             'ingredient__name',
             'ingredient__measurement_unit',
-        ).annotate(total=Sum('amount'))
+            'amount',
+        ).order_by('ingredient__name')
 
-        return self.return_file_in_responser(ingredients=ingredients)
-
-    @staticmethod
-    def return_file_in_responser(ingredients):
-        """Метод для формирования текстового списка ингредиентов."""
-        shopping_result = []
-        for ingredient in ingredients:
-            shopping_result.append(
-                f'{ingredient[0]} - '
-                f'{ingredient[2]} '
-                f'({ingredient[1]})'
-            )
-        shopping_itog = '\n'.join(shopping_result)
-        response = FileResponse(
-            shopping_itog,
-            content_type='text/plain',
-            as_attachment=True,
-            filename='Список покупок.txt'
-        )
-        return response
+        return request.accepted_renderer.get_response(
+            ingredients.iterator())
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from django.core.management.utils import get_random_secret_key
@@ -14,6 +15,9 @@ SECRET_KEY = os.getenv('SECRET_KEY', get_random_secret_key())
 
 DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
 
+DEBUG_TOOLBAR = DEBUG and os.getenv(
+    'DEBUG_TOOLBAR', 'False').lower() == 'true'
+
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '127.0.0.1,localhost').split(',')
 
 USERNAME_MAX_LEN = 150
@@ -28,9 +32,48 @@ MEAS_UNIT_NAME_MAX_LEN = 200
 RECIPE_NAME_MAX_LEN = 200
 RECIPE_INGREDIENT_MIN_AMOUNT = 1
 RECIPE_MIN_COOKING_TIME = 1
+# Конфигурация разбора поисковых запросов PostgreSQL. Должна совпадать
+# с конфигурацией индекса из миграции recipes 0010_recipe_search_index.
+RECIPE_SEARCH_CONFIG = 'russian'
 PAGE_SIZE_QUERY_PARAM = 'limit'
 
 DEFAULT_IMPORT_LOCATIONS = 'data/ingredients,data/tags'
+CATALOG_VERSION_KEY_PREFIX = 'catalog_version'
+BULK_BATCH_SIZE = 1000
+BULK_ACTION_MAX_ITEMS = 500
+ESTIMATED_COUNT_THRESHOLD = int(
+    os.getenv('ESTIMATED_COUNT_THRESHOLD', 100000))
+COUNT_VERSION_KEY_PREFIX = 'count_version'
+COUNT_CACHE_TIMEOUT = int(os.getenv('COUNT_CACHE_TIMEOUT', 300))
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+SHOPPING_LIST_PDF_MEMORY_LIMIT = 1024 * 1024
+# Варианты производных изображений рецептов: размер и обрезка до размера.
+RECIPE_IMAGE_DERIVATIVES = {
+    'card': ((480, 360), True),
+    'detail': ((1280, 1280), False),
+    'original': (None, False),
+}
+RECIPE_IMAGE_FORMATS = ('webp', 'jpeg')
+RECIPE_IMAGE_QUALITY = 80
+JOB_NAME_MAX_LEN = 200
+JOB_STATUS_MAX_LEN = 16
+JOB_QUEUE_EAGER = os.getenv('JOB_QUEUE_EAGER', 'False').lower() == 'true'
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 10
+JOB_RETRY_MAX_DELAY = 3600
+JOB_LOCK_TIMEOUT = 600
+JOB_POLL_INTERVAL = 1
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'True').lower() == 'true'
+QUERY_BUDGET = int(os.getenv('QUERY_BUDGET', 20))
+BENCHMARK_BASELINE = BASE_DIR / 'data' / 'benchmark_baseline.json'
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 1024))
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 60))
+AUTH_TOKEN_SHARED_CACHE = os.getenv(
+    'AUTH_TOKEN_SHARED_CACHE', 'True').lower() == 'true'
+AUTH_TOKEN_CACHE_KEY_PREFIX = 'auth_token'
+AUTH_TOKEN_VERSION_KEY_PREFIX = 'auth_token_version'
 
 AUTH_USER_MODEL = 'users.FoodgramUser'
 
@@ -48,14 +91,15 @@ INSTALLED_APPS = [
     'django_filters',
     'colorfield',
     'corsheaders',
-    'debug_toolbar',
     'djoser',
     'users',
     'recipes',
     'api',
+    'jobs',
 ]
 
 MIDDLEWARE = [
+    'api.performance.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -64,9 +108,13 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+    INTERNAL_IPS = ['127.0.0.1']
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -111,6 +159,66 @@ else:
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Кэш должен быть общим для всех процессов gunicorn и обработчика фоновых
+# задач, поэтому по умолчанию используется файловый кэш в каталоге
+# CACHE_LOCATION. Версии данных хранятся отдельно от остальных записей:
+# при переполнении кэш удаляет случайные записи, а потеря версии
+# сбрасывает снимки справочников и валидаторы условных запросов.
+# Предел записей кэша версий должен превышать их число — около четырёх
+# на пользователя.
+
+CACHE_LOCATION = os.getenv(
+    'CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'foodgram_cache'))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.path.join(CACHE_LOCATION, 'default'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+    'versions': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.path.join(CACHE_LOCATION, 'versions'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('VERSION_CACHE_MAX_ENTRIES',
+                                         1000000)),
+        },
+    },
+}
+VERSION_CACHE_ALIAS = 'versions'
+
+
+# Logging
+# https://docs.djangoproject.com/en/5.0/topics/logging/
+# Метрики запросов пишутся логгером api.performance: на уровне INFO
+# для каждого запроса, на уровне WARNING при превышении бюджета запросов.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.performance': {
+            'handlers': ['console'],
+            'level': os.getenv('PERFORMANCE_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -162,7 +270,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
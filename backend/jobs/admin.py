@@ -0,0 +1,31 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from jobs.models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Администрирование фоновых задач."""
+
+    list_display = (
+        'id',
+        'name',
+        'status',
+        'priority',
+        'attempts',
+        'max_attempts',
+        'run_at',
+        'locked_by',
+    )
+    list_filter = ('status', 'name',)
+    search_fields = ('name',)
+    readonly_fields = ('attempts', 'locked_at', 'locked_by', 'last_error',
+                       'created_at',)
+    actions = ('retry',)
+
+    @admin.action(description='Повторить выбранные задачи')
+    def retry(self, request, queryset):
+        """Действие для повторного запуска задач с ошибкой."""
+        queryset.filter(status=Job.FAILED).update(
+            status=Job.PENDING, attempts=0, run_at=timezone.now())
@@ -0,0 +1,76 @@
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from jobs.queue import claim_job, release_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    """Класс комманды Django для запуска обработчика фоновых задач.
+
+    Обработчик по очереди захватывает готовые задачи с наибольшим
+    приоритетом и выполняет их. Пока очередь пуста, база данных
+    опрашивается раз в JOB_POLL_INTERVAL секунд. Как и при обработке
+    запросов, перед каждой задачей закрываются соединения с базой данных,
+    пережившие CONN_MAX_AGE или ставшие непригодными. Сигнал SIGTERM
+    останавливает обработчик после текущей задачи.
+    """
+
+    help = 'Запускает обработчик фоновых задач.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и завершить работу.'
+        )
+        parser.add_argument(
+            '--max-jobs',
+            type=int,
+            default=0,
+            help='Завершить работу после указанного числа задач.'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=settings.JOB_POLL_INTERVAL,
+            help='Интервал опроса пустой очереди в секундах.'
+        )
+
+    def stop(self, *args):
+        """Метод для остановки обработчика после текущей задачи."""
+        self.running = False
+
+    def handle(self, *args, **options):
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.stdout.write(f'Обработчик {worker} запущен.')
+
+        done = failed = 0
+        while self.running:
+            close_old_connections()
+            release_stale_jobs()
+            job = claim_job(worker)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            if run_job(job):
+                done += 1
+            else:
+                failed += 1
+                self.stderr.write(f'Задача {job} завершилась ошибкой.')
+            if options['max_jobs'] and done + failed >= options['max_jobs']:
+                break
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработчик {worker} остановлен. Выполнено задач: {done}, '
+            f'с ошибками: {failed}.'))
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Модель фоновой задачи.
+
+    Содержит имя зарегистрированной задачи, её аргументы, приоритет,
+    состояние, число попыток, время следующего запуска и текст
+    последней ошибки. Выполненные задачи удаляются из очереди.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Ожидает'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=settings.JOB_NAME_MAX_LEN)
+    payload = models.JSONField('Аргументы', default=dict, blank=True)
+    priority = models.SmallIntegerField('Приоритет', default=0)
+    status = models.CharField('Состояние',
+                              max_length=settings.JOB_STATUS_MAX_LEN,
+                              choices=STATUS_CHOICES,
+                              default=PENDING)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'Максимум попыток',
+        default=settings.JOB_MAX_ATTEMPTS
+    )
+    run_at = models.DateTimeField('Время запуска', default=timezone.now)
+    locked_at = models.DateTimeField('Время захвата', null=True, blank=True)
+    locked_by = models.CharField('Обработчик',
+                                 max_length=settings.JOB_NAME_MAX_LEN,
+                                 blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+
+    class Meta:
+        """Класс Meta модели."""
+
+        ordering = ('-priority', 'run_at', 'id')
+        verbose_name = 'задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(fields=('status', '-priority', 'run_at', 'id'),
+                         name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
@@ -0,0 +1,139 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def task(name, priority=0, max_attempts=None):
+    """Декоратор регистрации функции как фоновой задачи.
+
+    Функция получает аргументы задачи как именованные параметры.
+    Декоратор добавляет функции метод enqueue(**payload) для постановки
+    задачи в очередь с приоритетом и числом попыток по умолчанию.
+    """
+    def decorator(func):
+        registry[name] = func
+
+        def enqueue(**payload):
+            return enqueue_job(name, payload, priority=priority,
+                               max_attempts=max_attempts)
+
+        func.enqueue = enqueue
+        return func
+    return decorator
+
+
+def enqueue_job(name, payload=None, priority=0, max_attempts=None,
+                run_at=None):
+    """Функция постановки задачи в очередь.
+
+    Задача записывается в той же транзакции, что и вызвавшие её
+    изменения данных, и становится видна обработчику после фиксации.
+    При JOB_QUEUE_EAGER задача выполняется сразу после фиксации
+    транзакции в текущем процессе.
+    """
+    if name not in registry:
+        raise KeyError(f'Задача {name} не зарегистрирована.')
+    payload = payload or {}
+    if settings.JOB_QUEUE_EAGER:
+        transaction.on_commit(lambda: registry[name](**payload))
+        return None
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        priority=priority,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        run_at=run_at or timezone.now(),
+    )
+
+
+def get_retry_delay(attempts):
+    """Функция получения задержки перед повтором задачи.
+
+    Задержка растёт экспоненциально от JOB_RETRY_DELAY и не превышает
+    JOB_RETRY_MAX_DELAY секунд.
+    """
+    return timedelta(seconds=min(
+        settings.JOB_RETRY_DELAY * 2 ** (attempts - 1),
+        settings.JOB_RETRY_MAX_DELAY
+    ))
+
+
+def release_stale_jobs():
+    """Функция возврата в очередь задач, зависших у обработчиков.
+
+    Задачи, захваченные дольше JOB_LOCK_TIMEOUT секунд назад, считаются
+    брошенными остановленным обработчиком.
+    """
+    return Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOB_LOCK_TIMEOUT)
+    ).update(status=Job.PENDING, locked_at=None, locked_by='')
+
+
+def claim_job(worker):
+    """Функция захвата следующей задачи обработчиком worker.
+
+    Выбирается готовая к запуску задача с наибольшим приоритетом.
+    В PostgreSQL строки, захватываемые другими обработчиками, пропускаются
+    SELECT ... FOR UPDATE SKIP LOCKED. Захват подтверждается условным
+    UPDATE, поэтому одну задачу не получат два обработчика и в SQLite.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = Job.objects.filter(
+            status=Job.PENDING, run_at__lte=now
+        ).order_by('-priority', 'run_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        job = queryset.first()
+        if job is None:
+            return None
+        claimed = Job.objects.filter(pk=job.pk, status=Job.PENDING).update(
+            status=Job.RUNNING,
+            locked_at=now,
+            locked_by=worker,
+            attempts=F('attempts') + 1
+        )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job):
+    """Функция выполнения захваченной задачи.
+
+    Выполненная задача удаляется. При ошибке задача возвращается
+    в очередь с растущей задержкой, а после max_attempts попыток
+    остаётся в состоянии ошибки. Возвращает True при успехе.
+    """
+    func = registry.get(job.name)
+    try:
+        if func is None:
+            raise KeyError(f'Задача {job.name} не зарегистрирована.')
+        func(**job.payload)
+    except Exception:
+        logger.exception('Ошибка выполнения задачи %s', job)
+        failed = job.attempts >= job.max_attempts
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.FAILED if failed else Job.PENDING,
+            run_at=timezone.now() + get_retry_delay(job.attempts),
+            locked_at=None,
+            locked_by='',
+            last_error=traceback.format_exc()
+        )
+        return False
+    Job.objects.filter(pk=job.pk).delete()
+    return True
@@ -1,7 +1,83 @@
+from django import forms
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db.models import Prefetch
+from django.utils.functional import cached_property
 
 from recipes.models import (Favourites, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.utils import get_estimated_count
+
+User = get_user_model()
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор с оценочным подсчётом числа объектов.
+
+    Для нефильтрованного списка большой таблицы использует оценку
+    числа строк из статистики PostgreSQL вместо COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = get_estimated_count(self.object_list.model)
+            if (estimate is not None
+                    and estimate >= settings.ESTIMATED_COUNT_THRESHOLD):
+                return estimate
+        return super().count
+
+
+class AuthorAutocompleteFilter(admin.SimpleListFilter):
+    """Фильтр по автору рецепта с поиском автора через автодополнение.
+
+    Не загружает список всех пользователей при отображении страницы.
+    """
+
+    title = 'автору'
+    parameter_name = 'author__id__exact'
+    template = 'admin/recipes/autocomplete_filter.html'
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        self.form_field = forms.ModelChoiceField(
+            queryset=User.objects.all(),
+            required=False,
+            widget=AutocompleteSelect(model._meta.get_field('author'),
+                                      model_admin.admin_site)
+        )
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def queryset(self, request, queryset):
+        if self.value() and self.value().isdigit():
+            return queryset.filter(author_id=self.value())
+        return queryset
+
+    def choices(self, changelist):
+        self.query_string = changelist.get_query_string(
+            remove=[self.parameter_name])
+        yield {
+            'selected': self.value() is None,
+            'query_string': self.query_string,
+            'display': 'Все',
+        }
+
+    def widget(self):
+        """Метод для отображения поля выбора автора."""
+        return self.form_field.widget.render(
+            self.parameter_name, self.value(),
+            attrs={'id': 'author-autocomplete-filter',
+                   'data-query-string': self.query_string}
+        )
 
 
 @admin.register(Ingredient)
@@ -44,31 +120,47 @@ class RecipeAdmin(admin.ModelAdmin):
         'favourites_count',
         'display_tags'
     )
-    search_fields = ('name', 'author__username', 'favourites_count')
-    list_filter = ('name', 'author', 'tags')
+    search_fields = ('name', 'author__username')
+    list_filter = (AuthorAutocompleteFilter, 'tags')
+    readonly_fields = ('favourites_count',)
+    autocomplete_fields = ('author',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        """Статика списка рецептов с виджетом автодополнения автора."""
+        return super().media + AutocompleteSelect(
+            Recipe._meta.get_field('author'), self.admin_site
+        ).media
+
+    def get_queryset(self, request):
+        """Метод для загрузки связанных объектов списка рецептов.
+
+        Автор, ингредиенты и тэги загружаются заранее, поэтому число
+        запросов не зависит от количества рецептов на странице.
+        """
+        return super().get_queryset(request).select_related(
+            'author'
+        ).prefetch_related(
+            Prefetch('ingredients', queryset=Ingredient.objects.only('name')),
+            Prefetch('tags', queryset=Tag.objects.only('name')),
+        )
 
     @staticmethod
-    def get_sorted_names(queryset):
-        """Метод класса для возврата списка имён из QuerySet."""
-        return [
-            item for item in queryset.values_list('name', flat=True).order_by(
-                'name')
-        ]
-
-    @admin.display(description='Добавили в избранное')
-    def favourites_count(self, obj):
-        """Метод класса для получения числа подписок."""
-        return obj.favourites.count()
+    def get_sorted_names(objects):
+        """Метод класса для возврата отсортированного списка имён."""
+        return sorted(item.name for item in objects)
 
     @admin.display(description='Ингредиенты')
     def display_ingredients(self, recipe):
         """Метод класса для получения ингредиентов."""
-        return self.get_sorted_names(recipe.ingredients)
+        return self.get_sorted_names(recipe.ingredients.all())
 
     @admin.display(description='Теги')
     def display_tags(self, recipe):
         """Метод класса для получения тэгов."""
-        return self.get_sorted_names(recipe.tags)
+        return self.get_sorted_names(recipe.tags.all())
 
 
 @admin.register(ShoppingCart)
@@ -0,0 +1,100 @@
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+IMAGE_FORMATS = {
+    'webp': ('WEBP', 'webp', {'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'optimize': True, 'progressive': True}),
+}
+
+
+def get_derivative_name(name, variant, image_format):
+    """Функция получения имени файла производного изображения.
+
+    Производные изображения хранятся рядом с исходным файлом
+    в подкаталоге с названием варианта.
+    """
+    path = PurePosixPath(name)
+    extension = IMAGE_FORMATS[image_format][1]
+    return str(path.parent / variant / f'{path.stem}.{extension}')
+
+
+def get_derivative_names(name):
+    """Функция получения имён всех производных изображений файла."""
+    return {
+        variant: {
+            image_format: get_derivative_name(name, variant, image_format)
+            for image_format in settings.RECIPE_IMAGE_FORMATS
+        }
+        for variant in settings.RECIPE_IMAGE_DERIVATIVES
+    }
+
+
+def resize(source, size, crop):
+    """Функция изменения размера изображения для варианта.
+
+    При crop изображение обрезается точно до размера size, иначе
+    уменьшается с сохранением пропорций так, чтобы поместиться в size.
+    Изображения без size не изменяются.
+    """
+    if size is None:
+        return source
+    if crop:
+        return ImageOps.fit(source, size, Image.LANCZOS)
+    resized = source.copy()
+    resized.thumbnail(size, Image.LANCZOS)
+    return resized
+
+
+def encode(image, image_format):
+    """Функция кодирования изображения в формат image_format."""
+    pil_format, _, options = IMAGE_FORMATS[image_format]
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    content = BytesIO()
+    image.save(content, format=pil_format,
+               quality=settings.RECIPE_IMAGE_QUALITY, **options)
+    return content.getvalue()
+
+
+def make_derivatives(image):
+    """Функция создания производных изображений файла поля image.
+
+    Для каждого варианта RECIPE_IMAGE_DERIVATIVES изображение
+    перекодируется во все форматы RECIPE_IMAGE_FORMATS и сохраняется
+    в хранилище поля. Возвращает False, если исходный файл
+    отсутствует или не является изображением.
+    """
+    try:
+        with image.storage.open(image.name, 'rb') as file:
+            with Image.open(file) as source:
+                source = ImageOps.exif_transpose(source)
+                source.load()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return False
+    if source.mode not in ('RGB', 'RGBA'):
+        source = source.convert('RGBA' if 'A' in source.getbands()
+                                else 'RGB')
+
+    names = get_derivative_names(image.name)
+    for variant, (size, crop) in settings.RECIPE_IMAGE_DERIVATIVES.items():
+        resized = resize(source, size, crop)
+        for image_format, name in names[variant].items():
+            image.storage.delete(name)
+            image.storage.save(
+                name, ContentFile(encode(resized, image_format)))
+    return True
+
+
+def has_derivatives(image):
+    """Функция проверки наличия всех производных изображений файла."""
+    return all(
+        image.storage.exists(name)
+        for formats in get_derivative_names(image.name).values()
+        for name in formats.values()
+    )
@@ -0,0 +1,451 @@
+import csv
+import io
+import json
+import time
+from collections import Counter
+from itertools import islice
+from os.path import basename, isfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DataError, IntegrityError, connection, transaction
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.utils import (bump_catalog_version, bump_count_version,
+                           change_counter)
+
+User = get_user_model()
+
+
+def batched(iterable, size):
+    """Функция разбиения потока на списки длиной не более size."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def iter_json_objects(file, chunk_size=64 * 1024):
+    """Функция потокового чтения объектов из файла json.
+
+    Поддерживает как массив объектов, в том числе записанный одной
+    строкой, так и файлы json lines. Файл читается частями по chunk_size
+    символов, поэтому в памяти находится не больше одного объекта
+    и одной части файла.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n[],':
+            position += 1
+        if position == len(buffer):
+            if eof:
+                return
+            buffer, position = file.read(chunk_size), 0
+            eof = not buffer
+            continue
+        try:
+            obj, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield obj
+        position = end
+
+
+CSV_FIELDS = {
+    'ingredients': ('name', 'measurement_unit'),
+    'tags': ('name', 'color', 'slug'),
+}
+
+
+class CSVStream:
+    """Класс файлоподобного потока строк в формате csv.
+
+    Преобразует поток словарей полей fields в текст csv по мере чтения
+    методом read, чтобы передать его в COPY ... FROM STDIN без
+    сохранения всех строк в памяти. Без fields строки передаются
+    последовательностями значений.
+    """
+
+    def __init__(self, rows, fields=None):
+        self.rows = iter(rows)
+        self.fields = fields
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator='\n')
+        self.pending = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.pending) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(
+                row if self.fields is None
+                else [row[field] for field in self.fields])
+            self.pending += self.buffer.getvalue()
+            self.buffer.seek(0)
+            self.buffer.truncate()
+        if size < 0:
+            size = len(self.pending)
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+
+def copy_rows(model, fields, rows):
+    """Функция загрузки строк в таблицу модели командой COPY PostgreSQL.
+
+    Строки передаются потоком кортежей значений полей fields без
+    создания объектов модели. Ошибки COPY преобразуются в исключения
+    Django, как и ошибки обычных запросов. Возвращает число
+    загруженных строк.
+    """
+    meta = model._meta
+    quote = connection.ops.quote_name
+    columns = ', '.join(
+        quote(meta.get_field(name).column) for name in fields)
+    with connection.cursor() as cursor, connection.wrap_database_errors:
+        cursor.copy_expert(
+            f'COPY {quote(meta.db_table)} ({columns}) '
+            f'FROM STDIN WITH (FORMAT csv)',
+            CSVStream(rows))
+        return cursor.rowcount
+
+
+class CatalogImporter:
+    """Класс загрузки пакетов объектов справочника.
+
+    Объекты сопоставляются с уже сохранёнными по полям key_fields.
+    Существующие объекты получают новые значения полей update_fields,
+    остальные создаются.
+    """
+
+    def __init__(self, model, key_fields, update_fields=()):
+        self.model = model
+        self.key_fields = key_fields
+        self.update_fields = update_fields
+
+    def get_key(self, obj):
+        """Метод для получения ключа объекта или словаря полей."""
+        if isinstance(obj, dict):
+            return tuple(obj[field] for field in self.key_fields)
+        return tuple(getattr(obj, field) for field in self.key_fields)
+
+    def import_batch(self, rows):
+        """Метод для загрузки пакета строк.
+
+        Выполняет один запрос поиска существующих объектов, не более
+        одного bulk_update и одного bulk_create. Возвращает число
+        созданных, обновлённых и пропущенных строк.
+        """
+        total = len(rows)
+        rows = {self.get_key(row): row for row in rows}
+        first_field = self.key_fields[0]
+        existing = {
+            self.get_key(obj): obj for obj in self.model.objects.filter(
+                **{f'{first_field}__in': {key[0] for key in rows}})
+        }
+        changed = []
+        for key, obj in existing.items():
+            row = rows.get(key)
+            if row is None:
+                continue
+            if any(getattr(obj, field) != row[field]
+                   for field in self.update_fields):
+                for field in self.update_fields:
+                    setattr(obj, field, row[field])
+                changed.append(obj)
+        new = [
+            self.model(**row) for key, row in rows.items()
+            if key not in existing
+        ]
+        with transaction.atomic():
+            if changed:
+                self.model.objects.bulk_update(changed, self.update_fields)
+            self.model.objects.bulk_create(new, ignore_conflicts=True)
+        return len(new), len(changed), total - len(new) - len(changed)
+
+    def copy(self, source, columns):
+        """Метод для загрузки потока csv командой COPY PostgreSQL.
+
+        Строки копируются во временную таблицу и одним запросом INSERT
+        ... ON CONFLICT переносятся в таблицу модели. При повторе ключа
+        в файле используется последняя строка. Временная таблица
+        удаляется сразу, так как загрузка может выполняться во внешней
+        транзакции. Возвращает число строк, созданных, обновлённых
+        и пропущенных объектов.
+        """
+        meta = self.model._meta
+        quote = connection.ops.quote_name
+        staging = quote('import_staging')
+        table = quote(meta.db_table)
+        fields = ', '.join(
+            f'{quote(meta.get_field(name).column)} '
+            f'{meta.get_field(name).db_type(connection)}'
+            for name in columns
+        )
+        columns = ', '.join(
+            quote(meta.get_field(name).column) for name in columns)
+        keys = ', '.join(
+            quote(meta.get_field(name).column) for name in self.key_fields)
+        if self.update_fields:
+            updates = [
+                quote(meta.get_field(name).column)
+                for name in self.update_fields
+            ]
+            current = ', '.join(f'{table}.{column}' for column in updates)
+            excluded = ', '.join(f'EXCLUDED.{column}' for column in updates)
+            conflict = (
+                'DO UPDATE SET '
+                + ', '.join(f'{column} = EXCLUDED.{column}'
+                            for column in updates)
+                + f' WHERE ({current}) IS DISTINCT FROM ({excluded})'
+            )
+        else:
+            conflict = 'DO NOTHING'
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {staging} '
+                f'(row_number bigserial, {fields}) ON COMMIT DROP')
+            with connection.wrap_database_errors:
+                cursor.copy_expert(
+                    f'COPY {staging} ({columns}) FROM STDIN '
+                    f'WITH (FORMAT csv)', source)
+            rows = cursor.rowcount
+            cursor.execute(
+                f'WITH merged AS ('
+                f'INSERT INTO {table} ({columns}) '
+                f'SELECT DISTINCT ON ({keys}) {columns} FROM {staging} '
+                f'ORDER BY {keys}, row_number DESC '
+                f'ON CONFLICT ({keys}) {conflict} '
+                f'RETURNING (xmax = 0) AS inserted) '
+                f'SELECT count(*) FILTER (WHERE inserted), '
+                f'count(*) FILTER (WHERE NOT inserted) FROM merged')
+            created, updated = cursor.fetchone()
+            cursor.execute(f'DROP TABLE {staging}')
+        return rows, created, updated, rows - created - updated
+
+    def finish(self):
+        """Метод для завершения загрузки."""
+        bump_catalog_version(self.model)
+
+
+class RecipeImporter:
+    """Класс загрузки пакетов рецептов.
+
+    Рецепт описывается словарём с полями author (username автора), name,
+    text, cooking_time, image (путь к файлу в MEDIA_ROOT), tags (список
+    слагов) и ingredients (список словарей name, measurement_unit,
+    amount). Рецепты со ссылками на несуществующих авторов, тэги или
+    ингредиенты пропускаются.
+    """
+
+    model = Recipe
+
+    def __init__(self):
+        self.tags = Tag.objects.in_bulk(field_name='slug')
+
+    @staticmethod
+    def assign_pks(objs):
+        """Метод для получения первичных ключей созданных рецептов.
+
+        Если СУБД не возвращает ключи из bulk_create (SQLite в Django 3.2),
+        они читаются как последние ключи таблицы. Пока транзакция
+        удерживает блокировку записи SQLite, другие процессы не могут
+        добавить строки между вставкой и чтением.
+        """
+        if connection.features.can_return_rows_from_bulk_insert:
+            return
+        pks = Recipe.objects.order_by('-pk').values_list(
+            'pk', flat=True)[:len(objs)]
+        for obj, pk in zip(objs, reversed(pks)):
+            obj.pk = pk
+
+    def import_batch(self, rows):
+        """Метод для загрузки пакета рецептов.
+
+        Число запросов на пакет не зависит от его размера. Возвращает
+        число созданных, обновлённых и пропущенных рецептов.
+        """
+        authors = User.objects.in_bulk(
+            {row.get('author') for row in rows}, field_name='username')
+        ingredients = {
+            (ingredient.name, ingredient.measurement_unit): ingredient
+            for ingredient in Ingredient.objects.filter(name__in={
+                item['name'] for row in rows
+                for item in row.get('ingredients', ())
+            })
+        }
+
+        recipes, links = [], []
+        for row in rows:
+            author = authors.get(row.get('author'))
+            tags = [self.tags.get(slug) for slug in row.get('tags', ())]
+            items = [
+                (ingredients.get((item['name'], item['measurement_unit'])),
+                 item['amount'])
+                for item in row.get('ingredients', ())
+            ]
+            if (author is None or not tags or None in tags or not items
+                    or any(ingredient is None for ingredient, _ in items)):
+                continue
+            recipes.append(Recipe(
+                author=author,
+                name=row['name'],
+                text=row['text'],
+                cooking_time=row['cooking_time'],
+                image=row.get('image', ''),
+            ))
+            links.append((tags, items))
+
+        with transaction.atomic():
+            Recipe.objects.bulk_create(recipes)
+            self.assign_pks(recipes)
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag.pk)
+                for recipe, (tags, _) in zip(recipes, links)
+                for tag in set(tags)
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe_id=recipe.pk, ingredient=ingredient,
+                                 amount=amount)
+                for recipe, (_, items) in zip(recipes, links)
+                for ingredient, amount in dict(items).items()
+            )
+            for author_id, count in Counter(
+                    recipe.author_id for recipe in recipes).items():
+                change_counter(User, author_id, 'recipes_count', count)
+        return len(recipes), 0, len(rows) - len(recipes)
+
+    def finish(self):
+        """Метод для завершения загрузки."""
+        bump_count_version(Recipe)
+
+
+class BaseImportCommand(BaseCommand):
+    """Базовый класс комманд Django для импорта данных в базу.
+
+    Читает строки файла потоком, поэтому расход памяти не зависит
+    от размера файла. В PostgreSQL справочники загружаются командой COPY
+    через временную таблицу, в остальных случаях строки загружаются
+    пакетами по batch_size через ORM. Модель определяется по имени файла
+    или параметру --model. По завершении выводит число строк, время
+    и скорость загрузки.
+    """
+
+    extension = None
+    importers = {
+        'ingredients': lambda: CatalogImporter(
+            Ingredient, ('name', 'measurement_unit')),
+        'tags': lambda: CatalogImporter(Tag, ('slug',), ('name', 'color')),
+        'recipes': RecipeImporter,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', type=str, nargs='?',
+                            default=settings.DEFAULT_IMPORT_LOCATIONS)
+        parser.add_argument(
+            '--model',
+            choices=self.importers,
+            help='Модель данных файла, если её нельзя определить по имени.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.BULK_BATCH_SIZE,
+            help='Число строк в одном пакете загрузки.'
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY PostgreSQL, загружать через ORM.'
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        self.use_copy = (not options['no_copy']
+                         and connection.vendor == 'postgresql')
+        if options['file'] == settings.DEFAULT_IMPORT_LOCATIONS:
+            file_list = [
+                f'{file}.{self.extension}'
+                for file in options['file'].split(',')
+            ]
+        else:
+            file_list = [options['file']]
+        for file_path in file_list:
+            self.add_to_database(file_path, options['model'],
+                                 options['batch_size'])
+
+    def get_model_name(self, file_path):
+        """Метод для определения модели по имени файла."""
+        name = basename(file_path)
+        for model_name in self.importers:
+            if name.startswith(model_name):
+                return model_name
+        return None
+
+    def read_rows(self, file, model_name):
+        """Метод для чтения строк файла в виде словарей полей."""
+        raise NotImplementedError
+
+    def get_copy_source(self, file, model_name):
+        """Метод для получения потока csv с полями CSV_FIELDS для COPY."""
+        return CSVStream(self.read_rows(file, model_name),
+                         CSV_FIELDS[model_name])
+
+    def load_copy(self, importer, file, model_name):
+        """Метод для загрузки файла командой COPY."""
+        rows, created, updated, skipped = importer.copy(
+            self.get_copy_source(file, model_name), CSV_FIELDS[model_name])
+        return Counter(rows=rows, created=created, updated=updated,
+                       skipped=skipped)
+
+    def load_batches(self, importer, file, model_name, batch_size):
+        """Метод для загрузки файла пакетами через ORM."""
+        totals = Counter()
+        for batch in batched(self.read_rows(file, model_name), batch_size):
+            created, updated, skipped = importer.import_batch(batch)
+            totals.update(rows=len(batch), created=created,
+                          updated=updated, skipped=skipped)
+            if self.verbosity > 1:
+                self.stdout.write(f'Загружено строк: {totals["rows"]}.')
+        return totals
+
+    def add_to_database(self, file_path, model_name, batch_size):
+        if not isfile(file_path):
+            self.stdout.write(
+                self.style.ERROR(f'Файл {file_path} не найден.'))
+            return
+        model_name = model_name or self.get_model_name(file_path)
+        if model_name is None:
+            raise CommandError(
+                f'Не удалось определить модель для файла {file_path}.')
+
+        importer = self.importers[model_name]()
+        use_copy = self.use_copy and hasattr(importer, 'copy')
+        started = time.monotonic()
+        with open(file_path, encoding='utf-8', newline='') as file:
+            try:
+                if use_copy:
+                    totals = self.load_copy(importer, file, model_name)
+                else:
+                    totals = self.load_batches(importer, file, model_name,
+                                               batch_size)
+            except (IntegrityError, DataError) as error:
+                raise CommandError(
+                    f'Ошибка загрузки файла {file_path}: {error}')
+        importer.finish()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{importer.model._meta.verbose_name_plural} '
+            f'({"COPY" if use_copy else "ORM"}): '
+            f'строк {totals["rows"]}, создано {totals["created"]}, '
+            f'обновлено {totals["updated"]}, '
+            f'пропущено {totals["skipped"]} за {elapsed:.2f} с '
+            f'({totals["rows"] / elapsed if elapsed else 0:.0f} строк/с).'))
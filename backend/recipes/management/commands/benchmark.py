@@ -0,0 +1,368 @@
+import json
+import random
+import tempfile
+from io import StringIO
+from math import ceil
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.authtoken.models import Token
+
+from api.authentication import get_token_cache_stats, local_cache
+from recipes.models import Favourites, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Follow
+
+User = get_user_model()
+
+# Размеры страниц списка рецептов, для которых число запросов должно
+# совпадать: иначе в списке появился N+1.
+SCALING_LIMITS = (6, 60, 600)
+# Число рецептов в пакетном запросе добавления в список покупок.
+BULK_ITEMS = 50
+
+PLACEHOLDER_IMAGE = (
+    'data:image/gif;base64,'
+    'R0lGODlhAQABAIAAAP///wAAACH5BAEAAAAALAAAAAABAAEAAAICRAEAOw=='
+)
+
+
+def percentile(values, percent):
+    """Функция вычисления перцентиля методом ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[max(ceil(len(ordered) * percent / 100) - 1, 0)]
+
+
+class Command(BaseCommand):
+    """Класс комманды Django для замера производительности эндпоинтов API.
+
+    Создаёт временную тестовую базу данных, заполняет её командой
+    seed_data одинаковым при каждом запуске набором данных и выполняет
+    запросы к основным эндпоинтам через тестовый клиент. Для каждого
+    сценария измеряется число SQL запросов с холодным и прогретым кэшем
+    и перцентили времени ответа. Результаты сравниваются с сохранённой
+    базовой линией: рост числа запросов считается регрессией. База
+    данных выбирается настройками проекта, поэтому команда работает
+    как с SQLite, так и с PostgreSQL.
+    """
+
+    help = 'Замеряет время ответа и число запросов основных эндпоинтов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=10,
+                            help='Число запросов в каждом сценарии.')
+        parser.add_argument('--recipes', type=int,
+                            default=max(SCALING_LIMITS) + 100,
+                            help='Число рецептов в наборе данных.')
+        parser.add_argument('--users', type=int, default=50,
+                            help='Число пользователей в наборе данных.')
+        parser.add_argument('--seed', type=int, default=1,
+                            help='Зерно генератора набора данных.')
+        parser.add_argument('--baseline', type=Path,
+                            default=settings.BENCHMARK_BASELINE,
+                            help='Файл базовой линии.')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Сохранить результаты как базовую линию.')
+        parser.add_argument('--latency-tolerance', type=float, default=2.0,
+                            help='Допустимое отношение p95 к базовой '
+                                 'линии.')
+        parser.add_argument('--strict-latency', action='store_true',
+                            help='Завершаться ошибкой при замедлении '
+                                 'ответов.')
+
+    @staticmethod
+    def seed_data(options):
+        """Метод заполнения базы данных набором данных для замеров.
+
+        Справочники загружаются из файлов проекта, остальные данные
+        создаются командой seed_data. Пользователь, от имени которого
+        выполняются запросы, подписан на самых активных авторов, добавил
+        рецепты в избранное и список покупок.
+        """
+        for name in ('ingredients', 'tags'):
+            call_command('csv_import',
+                         str(settings.BASE_DIR / 'data' / f'{name}.csv'),
+                         stdout=StringIO())
+        call_command('seed_data', users=options['users'],
+                     recipes=options['recipes'], seed=options['seed'],
+                     images=1, prefix='benchmark', stdout=StringIO())
+
+        rng = random.Random(options['seed'])
+        user = User.objects.create(
+            email='benchmark@example.com', username='benchmark',
+            first_name='Имя', last_name='Фамилия',
+            password=make_password(None))
+        recipes = list(Recipe.objects.order_by('pk').values_list(
+            'pk', flat=True))
+        Follow.objects.bulk_create(
+            Follow(user=user, following=author)
+            for author in User.objects.order_by('-recipes_count', 'pk')[:12]
+        )
+        Favourites.objects.bulk_create(
+            Favourites(user=user, recipe_id=recipe)
+            for recipe in rng.sample(recipes, 40))
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe_id=recipe)
+            for recipe in rng.sample(recipes, 8))
+        for command in ('reconcile_counters', 'rebuild_shopping_lists'):
+            call_command(command, stdout=StringIO())
+        return user, list(Tag.objects.order_by('pk'))
+
+    def get_scenarios(self, user, tags):
+        """Метод получения сценариев замера.
+
+        Сценарий состоит из названия, метода, адреса, тела запроса и
+        необязательных функций подготовки и отката изменений, которые
+        выполняются вне замера.
+        """
+        recipe = Recipe.objects.exclude(
+            favourites__user=user).exclude(shopping_carts__user=user).exclude(
+            author=user).order_by('id').first().id
+        own_recipe = Recipe.objects.create(
+            author=user, name='Рецепт', text='Описание', cooking_time=10,
+            image='recipes/images/benchmark.png')
+        own_recipe.tags.set(tags[:2])
+        author = Follow.objects.filter(user=user).first().following_id
+        unfollowed = User.objects.exclude(following__user=user).exclude(
+            pk=user.pk).order_by('-id').first().id
+        ingredients = list(Ingredient.objects.values_list(
+            'id', flat=True)[:5])
+        recipe_data = {
+            'ingredients': [{'id': ingredient, 'amount': 10}
+                            for ingredient in ingredients],
+            'tags': [tag.id for tag in tags[:2]],
+            'image': PLACEHOLDER_IMAGE,
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 15,
+        }
+        bulk_ids = {'ids': list(Recipe.objects.exclude(
+            shopping_carts__user=user).order_by('id').values_list(
+            'id', flat=True)[:BULK_ITEMS])}
+        favorite = f'/api/recipes/{recipe}/favorite/'
+        cart = f'/api/recipes/{recipe}/shopping_cart/'
+        subscribe = f'/api/users/{unfollowed}/subscribe/'
+
+        def request(method, path):
+            return lambda client, response=None: getattr(client, method)(
+                path)
+
+        def delete_bulk_cart(client, response):
+            client.delete('/api/recipes/bulk_shopping_cart/', bulk_ids,
+                          content_type='application/json')
+
+        def delete_created(client, response):
+            client.delete(f'/api/recipes/{response.json()["id"]}/')
+
+        scenarios = [
+            ('recipes_list', 'get', '/api/recipes/', None, None, None),
+            ('recipes_list_page_2', 'get', '/api/recipes/?page=2',
+             None, None, None),
+            ('recipes_list_tags', 'get',
+             f'/api/recipes/?tags={tags[0].slug}&tags={tags[1].slug}',
+             None, None, None),
+            ('recipes_list_author', 'get', f'/api/recipes/?author={author}',
+             None, None, None),
+            ('recipes_list_favorited', 'get',
+             '/api/recipes/?is_favorited=1', None, None, None),
+            ('recipes_list_in_cart', 'get',
+             '/api/recipes/?is_in_shopping_cart=1', None, None, None),
+            ('recipes_search', 'get', '/api/recipes/?search=сах',
+             None, None, None),
+            ('recipes_list_popular', 'get',
+             '/api/recipes/?ordering=-favorites_count', None, None, None),
+        ]
+        scenarios.extend(
+            (f'recipes_list_limit_{limit}', 'get',
+             f'/api/recipes/?limit={limit}', None, None, None)
+            for limit in SCALING_LIMITS
+        )
+        scenarios.extend([
+            ('recipe_detail', 'get', f'/api/recipes/{recipe}/',
+             None, None, None),
+            ('subscriptions', 'get',
+             '/api/users/subscriptions/?recipes_limit=3', None, None, None),
+            ('users_list', 'get', '/api/users/', None, None, None),
+            ('ingredients_search', 'get', '/api/ingredients/?name=сах',
+             None, None, None),
+            ('download_shopping_cart', 'get',
+             '/api/recipes/download_shopping_cart/', None, None, None),
+            ('favorite_add', 'post', favorite, None,
+             None, request('delete', favorite)),
+            ('favorite_remove', 'delete', favorite, None,
+             request('post', favorite), None),
+            ('shopping_cart_add', 'post', cart, None,
+             None, request('delete', cart)),
+            ('shopping_cart_remove', 'delete', cart, None,
+             request('post', cart), None),
+            ('shopping_cart_bulk_add', 'post',
+             '/api/recipes/bulk_shopping_cart/', bulk_ids,
+             None, delete_bulk_cart),
+            ('subscribe', 'post', subscribe, None,
+             None, request('delete', subscribe)),
+            ('recipe_create', 'post', '/api/recipes/', recipe_data,
+             None, delete_created),
+            ('recipe_update', 'patch', f'/api/recipes/{own_recipe.id}/',
+             {'name': 'Изменённый рецепт', 'cooking_time': 20},
+             None, None),
+        ])
+        return scenarios
+
+    def run_scenario(self, client, scenario, repeat):
+        """Метод выполнения сценария.
+
+        Первый запрос выполняется с очищенным кэшем, остальные с
+        прогретым. Время ответа считается по запросам с прогретым кэшем,
+        если их больше одного. Потоковые ответы читаются полностью, чтобы
+        учесть запросы, выполняемые при отдаче содержимого. Доля
+        попаданий в кэш токенов берётся из get_token_cache_stats.
+        """
+        name, method, path, data, before, after = scenario
+        for cache in caches.all():
+            cache.clear()
+        local_cache.clear()
+        durations = []
+        queries = []
+        for _ in range(repeat):
+            if before:
+                before(client)
+            with CaptureQueriesContext(connection) as context:
+                started = perf_counter()
+                response = getattr(client, method)(
+                    path, data, content_type='application/json'
+                ) if data else getattr(client, method)(path)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                durations.append((perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{name}: ответ {response.status_code} '
+                    f'{response.content[:200]!r}.')
+            queries.append(len(context))
+            if after:
+                after(client, response)
+        if len(durations) > 1:
+            durations = durations[1:]
+        return {
+            'queries_cold': queries[0],
+            'queries_warm': queries[-1],
+            'p50_ms': round(percentile(durations, 50), 2),
+            'p95_ms': round(percentile(durations, 95), 2),
+            'auth_hit_rate': get_token_cache_stats()['hit_rate'],
+        }
+
+    def run_benchmark(self, options):
+        """Метод заполнения базы данных и выполнения всех сценариев."""
+        user, tags = self.seed_data(options)
+        token = Token.objects.create(user=user)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        results = {}
+        for scenario in self.get_scenarios(user, tags):
+            results[scenario[0]] = self.run_scenario(
+                client, scenario, options['repeat'])
+            self.write_result(scenario[0], results[scenario[0]])
+        return results
+
+    def write_result(self, name, result):
+        """Метод вывода результата сценария."""
+        hit_rate = result.get('auth_hit_rate')
+        self.stdout.write(
+            f'{name:<28} запросов {result["queries_cold"]:>3} / '
+            f'{result["queries_warm"]:>3}  p50 {result["p50_ms"]:>8.2f} мс  '
+            f'p95 {result["p95_ms"]:>8.2f} мс  кэш токенов '
+            + ('-' if hit_rate is None else f'{hit_rate:.0%}')
+        )
+
+    @staticmethod
+    def compare(results, baseline, tolerance):
+        """Метод сравнения результатов с базовой линией.
+
+        Возвращает списки регрессий числа запросов и замедлений ответов.
+        Число запросов списка рецептов не должно зависеть от размера
+        страницы.
+        """
+        regressions = []
+        slowdowns = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            for key in ('queries_cold', 'queries_warm'):
+                if result[key] > expected[key]:
+                    regressions.append(
+                        f'{name}: {key} {result[key]} > {expected[key]}')
+            if result['p95_ms'] > expected['p95_ms'] * tolerance:
+                slowdowns.append(
+                    f'{name}: p95 {result["p95_ms"]} мс > '
+                    f'{expected["p95_ms"]} мс x {tolerance}')
+        for key in ('queries_cold', 'queries_warm'):
+            counts = {
+                limit: results[f'recipes_list_limit_{limit}'][key]
+                for limit in SCALING_LIMITS
+            }
+            if len(set(counts.values())) > 1:
+                regressions.append(
+                    f'recipes_list_limit: {key} зависит от размера '
+                    f'страницы {counts}')
+        return regressions, slowdowns
+
+    def handle(self, *args, **options):
+        if options['recipes'] < max(SCALING_LIMITS):
+            raise CommandError(
+                f'Нужно не меньше {max(SCALING_LIMITS)} рецептов.')
+        if options['repeat'] < 1:
+            raise CommandError('Число запросов должно быть больше нуля.')
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                           serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(
+                    CACHES={
+                        alias: {'BACKEND': 'django.core.cache.backends.'
+                                           'locmem.LocMemCache',
+                                'LOCATION': alias}
+                        for alias in settings.CACHES
+                    },
+                    MEDIA_ROOT=media_root,
+                    JOB_QUEUE_EAGER=False,
+                ):
+                    results = self.run_benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        path = options['baseline']
+        baselines = json.loads(path.read_text()) if path.exists() else {}
+        if options['update_baseline']:
+            baselines[connection.vendor] = results
+            path.write_text(json.dumps(baselines, indent=2,
+                                       ensure_ascii=False) + '\n')
+            self.stdout.write(self.style.SUCCESS(
+                f'Базовая линия {connection.vendor} сохранена в {path}.'))
+            return
+
+        baseline = baselines.get(connection.vendor)
+        if baseline is None:
+            self.stdout.write(self.style.WARNING(
+                f'Нет базовой линии {connection.vendor} в {path}.'))
+            baseline = {}
+        regressions, slowdowns = self.compare(
+            results, baseline, options['latency_tolerance'])
+        for message in slowdowns:
+            self.stdout.write(self.style.WARNING(message))
+        if regressions or (slowdowns and options['strict_latency']):
+            raise CommandError('Регрессии производительности:\n' + '\n'.join(
+                regressions + slowdowns))
+        self.stdout.write(self.style.SUCCESS('Регрессий не найдено.'))
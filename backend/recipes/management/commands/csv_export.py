@@ -0,0 +1,77 @@
+import csv
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from recipes.management.commands._private import CSV_FIELDS
+from recipes.models import Ingredient, Tag
+
+
+class Command(BaseCommand):
+    """Класс комманды Django для экспорта справочников в файл csv.
+
+    Формат файла совпадает с форматом комманды csv_import. В PostgreSQL
+    данные выгружаются командой COPY ... TO STDOUT, в остальных случаях
+    читаются итератором через ORM.
+    """
+
+    help = 'Выгружает ингредиенты или тэги в файл формата csv.'
+
+    models = {
+        'ingredients': Ingredient,
+        'tags': Tag,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=self.models)
+        parser.add_argument('csv_file', type=str)
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY PostgreSQL, выгружать через ORM.'
+        )
+
+    def export_copy(self, model, fields, file):
+        """Метод для выгрузки таблицы командой COPY."""
+        quote = connection.ops.quote_name
+        columns = ', '.join(
+            quote(model._meta.get_field(name).column) for name in fields)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY (SELECT {columns} FROM '
+                f'{quote(model._meta.db_table)} ORDER BY {columns}) '
+                f'TO STDOUT WITH (FORMAT csv)',
+                file)
+            return cursor.rowcount
+
+    def export_orm(self, model, fields, file):
+        """Метод для выгрузки таблицы итератором через ORM."""
+        writer = csv.writer(file, lineterminator='\n')
+        rows = 0
+        for row in model.objects.order_by(*fields).values_list(
+                *fields).iterator(chunk_size=settings.BULK_BATCH_SIZE):
+            writer.writerow(row)
+            rows += 1
+        return rows
+
+    def handle(self, *args, **options):
+        model = self.models[options['model']]
+        fields = CSV_FIELDS[options['model']]
+        use_copy = (not options['no_copy']
+                    and connection.vendor == 'postgresql')
+        started = time.monotonic()
+        with open(options['csv_file'], 'w', encoding='utf-8',
+                  newline='') as file:
+            if use_copy:
+                rows = self.export_copy(model, fields, file)
+            else:
+                rows = self.export_orm(model, fields, file)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{model._meta.verbose_name_plural} '
+            f'({"COPY" if use_copy else "ORM"}): выгружено строк {rows} '
+            f'за {elapsed:.2f} с '
+            f'({rows / elapsed if elapsed else 0:.0f} строк/с).'))
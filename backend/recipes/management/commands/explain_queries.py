@@ -0,0 +1,118 @@
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.views import FoodgramUserViewSet, RecipeViewSet
+from recipes.models import Ingredient, Recipe, ShoppingListItem, Tag
+
+User = get_user_model()
+
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)(?! USING)(?:\s|$)'),
+}
+
+
+class Command(BaseCommand):
+    """Класс комманды Django для проверки планов основных запросов API.
+
+    Выполняет EXPLAIN для запросов списков рецептов, подписок, списка
+    покупок и поиска ингредиентов и сообщает о последовательном
+    сканировании таблиц. Результаты имеют смысл на заполненной базе
+    данных: на маленьких таблицах СУБД выбирает полное сканирование.
+    """
+
+    help = 'Выводит планы основных запросов API и ищет полные сканирования.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=str, default=None,
+                            help='Email пользователя для запросов.')
+        parser.add_argument('--ignore', type=str,
+                            default=Tag._meta.db_table,
+                            help='Таблицы через запятую, для которых '
+                                 'полное сканирование допустимо.')
+        parser.add_argument('--strict', action='store_true',
+                            help='Завершаться ошибкой при полном '
+                                 'сканировании.')
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Выводить планы запросов полностью.')
+
+    @staticmethod
+    def get_view(viewset, user, action, params=None, **kwargs):
+        """Метод для создания вьюсета с запросом от имени пользователя."""
+        request = Request(RequestFactory().get('/', params or {}))
+        request.user = user
+        return viewset(request=request, action=action, format_kwarg=None,
+                       kwargs=kwargs)
+
+    def get_queries(self, user):
+        """Метод для получения проверяемых запросов."""
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        recipe_lists = [
+            ('Список рецептов', {}),
+            ('Рецепты автора', {'author': user.id}),
+            ('Избранное', {'is_favorited': 1}),
+            ('Список покупок', {'is_in_shopping_cart': 1}),
+        ]
+        tag = Tag.objects.filter(recipes__isnull=False).first()
+        if tag is not None:
+            recipe_lists.append(('Рецепты по тэгу', {'tags': tag.slug}))
+        queries = []
+        for title, params in recipe_lists:
+            view = self.get_view(RecipeViewSet, user, 'list', params)
+            queries.append((
+                title,
+                view.filter_queryset(view.get_queryset())[:page_size]
+            ))
+        recipe = Recipe.objects.first()
+        if recipe is not None:
+            view = self.get_view(RecipeViewSet, user, 'retrieve',
+                                 pk=recipe.pk)
+            queries.append(('Рецепт', view.get_queryset().filter(
+                pk=recipe.pk)))
+        authors = User.objects.filter(following__user=user)
+        queries.append(('Подписки', authors[:page_size]))
+        author_ids = list(authors.values_list('id', flat=True)[:page_size])
+        if author_ids:
+            queries.append(('Рецепты подписок', Recipe.objects.filter(
+                author__in=author_ids
+            ).order_by('-pub_date', '-id')))
+        view = self.get_view(FoodgramUserViewSet, user, 'list')
+        queries.append(('Пользователи', view.get_queryset()[:page_size]))
+        queries.append(('Скачивание списка покупок',
+                        ShoppingListItem.objects.filter(
+                            user=user).order_by('ingredient__name')))
+        queries.append(('Поиск ингредиентов',
+                        Ingredient.objects.filter(name__startswith='а')))
+        return queries
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+        else:
+            user = User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError('Пользователь не найден.')
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        ignored = set(filter(None, options['ignore'].split(',')))
+        found = 0
+        for title, queryset in self.get_queries(user):
+            plan = queryset.explain()
+            tables = set(pattern.findall(plan)) - ignored if pattern else ()
+            if options['verbose_plans']:
+                self.stdout.write(f'{title}:\n{plan}\n')
+            if tables:
+                found += 1
+                self.stdout.write(self.style.WARNING(
+                    f'{title}: полное сканирование {", ".join(sorted(tables))}'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{title}: OK'))
+        if found and options['strict']:
+            raise CommandError(
+                f'Полное сканирование в запросах: {found}.')
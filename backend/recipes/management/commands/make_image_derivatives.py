@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.images import make_derivatives
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Класс комманды Django для создания производных изображений.
+
+    Перекодирует изображения рецептов, для которых производные
+    изображения ещё не созданы, и отмечает обработанные рецепты
+    пакетами по BULK_BATCH_SIZE.
+    """
+
+    help = 'Создаёт производные изображения для загруженных рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать производные изображения всех рецептов.'
+        )
+
+    def mark(self, ids, ready):
+        """Метод для отметки наличия производных изображений рецептов."""
+        if ids:
+            Recipe.objects.filter(pk__in=ids).update(image_derivatives=ready)
+            ids.clear()
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only('pk', 'image')
+        if not options['force']:
+            recipes = recipes.filter(image_derivatives=False)
+
+        processed, failed = [], []
+        total_processed = total_failed = 0
+        for recipe in recipes.order_by('pk').iterator(
+                chunk_size=settings.BULK_BATCH_SIZE):
+            if make_derivatives(recipe.image):
+                processed.append(recipe.pk)
+                total_processed += 1
+            else:
+                failed.append(recipe.pk)
+                total_failed += 1
+                self.stderr.write(
+                    f'Не удалось обработать изображение рецепта '
+                    f'{recipe.pk}: {recipe.image.name}.')
+            if len(processed) + len(failed) >= settings.BULK_BATCH_SIZE:
+                self.mark(processed, True)
+                self.mark(failed, False)
+        self.mark(processed, True)
+        self.mark(failed, False)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {total_processed}, '
+            f'с ошибками: {total_failed}.'))
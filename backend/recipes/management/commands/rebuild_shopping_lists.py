@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import RecipeIngredient, ShoppingListItem
+
+
+class Command(BaseCommand):
+    """Класс комманды Django для пересчёта агрегированных списков покупок.
+
+    Пересчитывает модель ShoppingListItem по содержимому списков покупок.
+    С ключом --verify только сравнивает сохранённые значения с
+    рассчитанными и сообщает о расхождениях.
+    """
+
+    help = 'Пересчитывает или проверяет агрегированные списки покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Только проверить списки без изменений.')
+
+    @staticmethod
+    def get_expected_items():
+        """Метод для расчёта списков покупок по таблице ShoppingCart."""
+        return RecipeIngredient.objects.filter(
+            recipe__shopping_carts__isnull=False
+        ).values_list(
+            'recipe__shopping_carts__user', 'ingredient'
+        ).annotate(total=Sum('amount')).order_by().iterator()
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify()
+        else:
+            self.rebuild()
+
+    def verify(self):
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'amount').iterator()
+        }
+        mismatches = 0
+        for user_id, ingredient_id, total in self.get_expected_items():
+            if stored.pop((user_id, ingredient_id), None) != total:
+                mismatches += 1
+        mismatches += len(stored)
+        if mismatches:
+            raise CommandError(
+                f'Найдено расхождений в списках покупок: {mismatches}.')
+        self.stdout.write(self.style.SUCCESS('Списки покупок актуальны.'))
+
+    @transaction.atomic
+    def rebuild(self):
+        ShoppingListItem.objects.all().delete()
+        batch = []
+        count = 0
+        for user_id, ingredient_id, total in self.get_expected_items():
+            batch.append(ShoppingListItem(user_id=user_id,
+                                          ingredient_id=ingredient_id,
+                                          amount=total))
+            if len(batch) >= settings.BULK_BATCH_SIZE:
+                ShoppingListItem.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        ShoppingListItem.objects.bulk_create(batch)
+        count += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересчитаны, позиций: {count}.'))
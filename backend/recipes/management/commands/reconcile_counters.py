@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favourites, Recipe
+from users.models import Follow
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Класс комманды Django для сверки денормализованных счётчиков.
+
+    Пересчитывает счётчики избранного у рецептов, рецептов и подписчиков
+    у пользователей и исправляет расхождения одним запросом UPDATE на
+    каждый счётчик.
+    """
+
+    help = 'Исправляет расхождения в счётчиках рецептов и пользователей.'
+
+    counters = (
+        (Recipe, 'favourites_count', Favourites, 'recipe'),
+        (User, 'recipes_count', Recipe, 'author'),
+        (User, 'followers_count', Follow, 'following'),
+    )
+
+    @staticmethod
+    def count_subquery(model, field):
+        """Метод для получения подзапроса с числом связанных объектов."""
+        return Coalesce(Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ), 0)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model, counter, related_model, field in self.counters:
+            drifted = model.objects.annotate(
+                actual=self.count_subquery(related_model, field)
+            ).exclude(**{counter: F('actual')}).values('pk')
+            fixed = model.objects.filter(pk__in=Subquery(drifted)).update(
+                **{counter: self.count_subquery(related_model, field)})
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: {counter} '
+                f'исправлено записей: {fixed}.'))
@@ -0,0 +1,350 @@
+import random
+import time
+from io import BytesIO, StringIO
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from recipes.images import make_derivatives
+from recipes.management.commands._private import batched, copy_rows
+from recipes.models import (Favourites, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.utils import bump_count_version
+from users.models import Follow
+
+User = get_user_model()
+
+# Диапазоны количества ингредиента по единицам измерения.
+AMOUNT_RANGES = {
+    'г': (10, 1000),
+    'кг': (1, 3),
+    'мл': (50, 1000),
+    'шт.': (1, 10),
+    'по вкусу': (1, 1),
+    'щепотка': (1, 2),
+}
+DEFAULT_AMOUNT_RANGE = (1, 5)
+
+USER_FIELDS = ('email', 'username', 'first_name', 'last_name', 'password',
+               'is_superuser', 'is_staff', 'is_active', 'date_joined',
+               'recipes_count', 'followers_count')
+RECIPE_FIELDS = ('author_id', 'name', 'text', 'cooking_time', 'image',
+                 'image_derivatives', 'pub_date', 'updated_at',
+                 'favourites_count')
+
+RECIPE_TEXTS = (
+    'Подготовьте ингредиенты и разогрейте духовку.',
+    'Смешайте все ингредиенты в глубокой миске.',
+    'Готовьте на среднем огне, периодически помешивая.',
+    'Подавайте горячим, посыпав зеленью.',
+    'Дайте блюду настояться перед подачей.',
+)
+
+
+def zipf_weights(count, exponent=1.0):
+    """Функция получения накопленных весов распределения Ципфа.
+
+    Первые элементы выбираются чаще остальных, как популярные авторы,
+    рецепты и ингредиенты в реальном сервисе.
+    """
+    return list(accumulate(1 / (rank + 1) ** exponent
+                           for rank in range(count)))
+
+
+class Command(BaseCommand):
+    """Класс комманды Django для генерации тестовых данных.
+
+    Создаёт пользователей, рецепты с тэгами и ингредиентами из
+    существующих справочников, подписки, избранное и списки покупок.
+    Популярность авторов, рецептов и ингредиентов подчиняется
+    распределению Ципфа. Данные вставляются пакетами: в PostgreSQL
+    командой COPY, в остальных СУБД через bulk_create. При одинаковом
+    --seed и одинаковых справочниках данные совпадают между запусками.
+    Рецепты ссылаются на несколько заранее созданных
+    изображений-заглушек с готовыми производными изображениями.
+    """
+
+    help = 'Генерирует пользователей, рецепты, подписки и списки покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000,
+                            help='Число пользователей.')
+        parser.add_argument('--recipes', type=int, default=10000,
+                            help='Число рецептов.')
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Среднее число подписок пользователя.')
+        parser.add_argument('--favourites', type=int, default=20,
+                            help='Среднее число рецептов в избранном.')
+        parser.add_argument('--cart', type=int, default=3,
+                            help='Среднее число рецептов в списке покупок.')
+        parser.add_argument('--images', type=int, default=8,
+                            help='Число изображений-заглушек.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Зерно генератора случайных чисел.')
+        parser.add_argument('--prefix', type=str, default='seed',
+                            help='Префикс имён пользователей и файлов.')
+        parser.add_argument('--password', type=str, default=None,
+                            help='Пароль пользователей, по умолчанию вход '
+                                 'по паролю невозможен.')
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.BULK_BATCH_SIZE,
+                            help='Число строк в одном пакете вставки.')
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Не использовать COPY PostgreSQL, '
+                                 'вставлять строки через ORM.')
+
+    def report(self, title, count, started):
+        """Метод вывода числа созданных строк и скорости вставки."""
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'{title}: {count} за {elapsed:.2f} с '
+            f'({count / elapsed if elapsed else 0:.0f} строк/с).')
+
+    def create_images(self, rng, count, prefix):
+        """Метод создания изображений-заглушек и их производных.
+
+        Изображения кодируются один раз и используются всеми рецептами,
+        поэтому число рецептов не влияет на время работы с файлами.
+        Возвращает имена файлов и признак создания производных.
+        """
+        field = Recipe._meta.get_field('image')
+        names, derivatives = [], True
+        for number in range(count):
+            content = BytesIO()
+            color = tuple(rng.randrange(256) for _ in range(3))
+            Image.new('RGB', (640, 480), color).save(content, 'JPEG')
+            name = f'{field.upload_to}{prefix}-{number}.jpg'
+            field.storage.delete(name)
+            name = field.storage.save(name, ContentFile(content.getvalue()))
+            derivatives &= make_derivatives(field.attr_class(None, field,
+                                                             name))
+            names.append(name)
+        return names, derivatives
+
+    def insert(self, model, fields, rows):
+        """Метод вставки строк со значениями полей fields в таблицу модели.
+
+        В PostgreSQL строки загружаются командой COPY без создания
+        объектов модели, в остальных случаях через bulk_create.
+        """
+        if self.use_copy:
+            copy_rows(model, fields, rows)
+        else:
+            model.objects.bulk_create(
+                model(**dict(zip(fields, row))) for row in rows)
+
+    @staticmethod
+    def get_last_pk(model):
+        """Метод получения наибольшего первичного ключа таблицы модели."""
+        return model.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+
+    @staticmethod
+    def get_new_pks(model, last_pk):
+        """Метод получения ключей строк, добавленных после last_pk.
+
+        Ключи выдаются последовательностью в порядке вставки строк, пока
+        транзакция команды удерживает таблицы от параллельной записи
+        (в PostgreSQL для этого таблицы блокируются в handle).
+        """
+        return list(model.objects.filter(pk__gt=last_pk).order_by(
+            'pk').values_list('pk', flat=True))
+
+    def create_users(self, options, now):
+        """Метод создания пользователей.
+
+        Пароль хешируется один раз для всех пользователей.
+        """
+        password = make_password(options['password'])
+        prefix = options['prefix']
+        last_pk = self.get_last_pk(User)
+        for batch in batched(range(options['users']), options['batch_size']):
+            self.insert(User, USER_FIELDS, (
+                (f'{prefix}{number}@example.com', f'{prefix}{number}',
+                 f'Имя {number}', f'Фамилия {number}', password,
+                 False, False, True, now, 0, 0)
+                for number in batch
+            ))
+        return self.get_new_pks(User, last_pk)
+
+    @staticmethod
+    def make_recipe(rng, number, author, tags, tag_weights, ingredients,
+                    ingredient_weights, images, image_derivatives, now):
+        """Метод генерации строки рецепта, его тэгов и ингредиентов."""
+        recipe_tags = set(rng.choices(tags, cum_weights=tag_weights,
+                                      k=rng.randint(1, 3)))
+        chosen = rng.choices(ingredients, cum_weights=ingredient_weights,
+                             k=round(rng.triangular(3, 15, 6)))
+        items = {}
+        for pk, name, measurement_unit in chosen:
+            low, high = AMOUNT_RANGES.get(measurement_unit,
+                                          DEFAULT_AMOUNT_RANGE)
+            items[pk] = rng.randint(low, high)
+        recipe = (
+            author,
+            f'{chosen[0][1].capitalize()}, рецепт {number}'[
+                :settings.RECIPE_NAME_MAX_LEN],
+            ' '.join(rng.sample(RECIPE_TEXTS, 3)),
+            max(round(rng.lognormvariate(3.4, 0.6)), 1),
+            rng.choice(images),
+            image_derivatives,
+            now,
+            now,
+            0,
+        )
+        return recipe, recipe_tags, items
+
+    def create_recipes(self, rng, options, user_ids, images,
+                       image_derivatives, now):
+        """Метод создания рецептов пакетами.
+
+        Тэги и ингредиенты рецептов пакета вставляются сразу после
+        рецептов, поэтому в памяти хранится только текущий пакет.
+        Возвращает первичные ключи рецептов и число созданных связей.
+        """
+        tags = list(Tag.objects.order_by('pk').values_list('pk', flat=True))
+        ingredients = list(Ingredient.objects.order_by('pk').values_list(
+            'pk', 'name', 'measurement_unit'))
+        rng.shuffle(ingredients)
+        tag_weights = zipf_weights(len(tags), 0.5)
+        ingredient_weights = zipf_weights(len(ingredients))
+        author_weights = zipf_weights(len(user_ids))
+
+        recipe_ids, links = [], 0
+        for batch in batched(range(options['recipes']),
+                             options['batch_size']):
+            authors = rng.choices(user_ids, cum_weights=author_weights,
+                                  k=len(batch))
+            generated = [
+                self.make_recipe(rng, number, author, tags, tag_weights,
+                                 ingredients, ingredient_weights, images,
+                                 image_derivatives, now)
+                for number, author in zip(batch, authors)
+            ]
+            last_pk = self.get_last_pk(Recipe)
+            self.insert(Recipe, RECIPE_FIELDS,
+                        (recipe for recipe, _, _ in generated))
+            pks = self.get_new_pks(Recipe, last_pk)
+            recipe_tags = [
+                (pk, tag)
+                for pk, (_, tags_set, _) in zip(pks, generated)
+                for tag in tags_set
+            ]
+            recipe_ingredients = [
+                (pk, ingredient, amount)
+                for pk, (_, _, items) in zip(pks, generated)
+                for ingredient, amount in items.items()
+            ]
+            self.insert(Recipe.tags.through, ('recipe_id', 'tag_id'),
+                        recipe_tags)
+            self.insert(RecipeIngredient,
+                        ('recipe_id', 'ingredient_id', 'amount'),
+                        recipe_ingredients)
+            recipe_ids.extend(pks)
+            links += len(recipe_tags) + len(recipe_ingredients)
+        return recipe_ids, links
+
+    def create_relations(self, rng, model, fields, user_ids, targets,
+                         average, batch_size, exclude_self=False):
+        """Метод создания связей пользователей с объектами targets.
+
+        Число связей пользователя распределено равномерно от нуля до
+        удвоенного среднего, объекты выбираются по популярности. Авторы
+        для подписок выбираются с тем же распределением, что и авторы
+        рецептов. Возвращает число созданных связей.
+        """
+        if not targets or average <= 0:
+            return 0
+        weights = zipf_weights(len(targets))
+        created = 0
+        for batch in batched(user_ids, batch_size):
+            rows = []
+            for user_id in batch:
+                chosen = set(rng.choices(targets, cum_weights=weights,
+                                         k=rng.randint(0, 2 * average)))
+                if exclude_self:
+                    chosen.discard(user_id)
+                rows.extend((user_id, target) for target in sorted(chosen))
+            self.insert(model, fields, rows)
+            created += len(rows)
+        return created
+
+    def handle(self, *args, **options):
+        if not Tag.objects.exists() or not Ingredient.objects.exists():
+            raise CommandError(
+                'Справочники тэгов и ингредиентов пусты, загрузите их '
+                'командой csv_import.')
+        if options['users'] < 1 or options['images'] < 1:
+            raise CommandError(
+                'Нужен хотя бы один пользователь и одно изображение.')
+        self.use_copy = (not options['no_copy']
+                         and connection.vendor == 'postgresql')
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        now = timezone.now()
+
+        started = time.monotonic()
+        images, image_derivatives = self.create_images(
+            rng, options['images'], options['prefix'])
+        self.report('Изображения', len(images), started)
+
+        try:
+            with transaction.atomic():
+                if self.use_copy:
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            'LOCK TABLE {}, {} IN SHARE ROW EXCLUSIVE '
+                            'MODE'.format(*(
+                                connection.ops.quote_name(
+                                    model._meta.db_table)
+                                for model in (User, Recipe))))
+                started = time.monotonic()
+                user_ids = self.create_users(options, now)
+                self.report('Пользователи', len(user_ids), started)
+
+                started = time.monotonic()
+                recipe_ids, links = self.create_recipes(
+                    rng, options, user_ids, images, image_derivatives, now)
+                self.report('Рецепты', len(recipe_ids), started)
+                self.report('Связи рецептов с тэгами и ингредиентами',
+                            links, started)
+
+                relations = (
+                    ('Подписки', Follow, ('user_id', 'following_id'),
+                     user_ids, options['follows'], True),
+                    ('Избранное', Favourites, ('user_id', 'recipe_id'),
+                     recipe_ids, options['favourites'], False),
+                    ('Списки покупок', ShoppingCart,
+                     ('user_id', 'recipe_id'), recipe_ids, options['cart'],
+                     False),
+                )
+                for (title, model, fields, targets, average,
+                     exclude_self) in relations:
+                    started = time.monotonic()
+                    created = self.create_relations(
+                        rng, model, fields, user_ids, targets, average,
+                        batch_size, exclude_self)
+                    self.report(title, created, started)
+
+                started = time.monotonic()
+                for command in ('reconcile_counters',
+                                'rebuild_shopping_lists'):
+                    call_command(command, stdout=StringIO())
+                self.stdout.write(
+                    f'Счётчики и списки покупок пересчитаны за '
+                    f'{time.monotonic() - started:.2f} с.')
+        except IntegrityError as error:
+            raise CommandError(
+                f'Не удалось создать данные, возможно пользователи с '
+                f'префиксом {options["prefix"]} уже существуют: {error}')
+        bump_count_version(Recipe)
+        bump_count_version(User)
+        self.stdout.write(self.style.SUCCESS('Данные созданы.'))
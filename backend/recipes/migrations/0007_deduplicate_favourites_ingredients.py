@@ -0,0 +1,45 @@
+# Generated by Django 3.2.3 on 2026-10-18 05:48
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def deduplicate(apps, schema_editor):
+    Favourites = apps.get_model('recipes', 'Favourites')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+
+    duplicates = Favourites.objects.values('user', 'recipe').annotate(
+        keep_id=Min('id'), total=Count('id')
+    ).filter(total__gt=1).order_by()
+    for row in list(duplicates):
+        Favourites.objects.filter(
+            user=row['user'], recipe=row['recipe']
+        ).exclude(id=row['keep_id']).delete()
+        Recipe.objects.filter(pk=row['recipe']).update(
+            favourites_count=Favourites.objects.filter(
+                recipe=row['recipe']).count()
+        )
+
+    duplicates = RecipeIngredient.objects.values(
+        'recipe', 'ingredient'
+    ).annotate(
+        keep_id=Min('id'), total=Count('id'), amount_sum=Sum('amount')
+    ).filter(total__gt=1).order_by()
+    for row in list(duplicates):
+        RecipeIngredient.objects.filter(
+            recipe=row['recipe'], ingredient=row['ingredient']
+        ).exclude(id=row['keep_id']).delete()
+        RecipeIngredient.objects.filter(id=row['keep_id']).update(
+            amount=row['amount_sum'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_favourites_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate, migrations.RunPython.noop),
+    ]
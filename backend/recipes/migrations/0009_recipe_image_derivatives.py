@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 06:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_indexes_and_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_derivatives',
+            field=models.BooleanField(default=False, verbose_name='Производные изображения созданы'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.2.3 on 2026-10-18 07:30
+
+from django.db import migrations
+
+CREATE_INDEX_SQL = {
+    'postgresql': [
+        'ALTER TABLE "recipes_recipe" ADD COLUMN IF NOT EXISTS '
+        'search_vector tsvector GENERATED ALWAYS AS ('
+        "setweight(to_tsvector('russian'::regconfig, name), 'A') || "
+        "setweight(to_tsvector('russian'::regconfig, text), 'B')"
+        ') STORED',
+        'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+        'ON "recipes_recipe" USING gin (search_vector)',
+    ],
+    'sqlite': [
+        'CREATE VIRTUAL TABLE IF NOT EXISTS "recipes_recipe_search" '
+        'USING fts5(name, text, content="recipes_recipe", '
+        "content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        'CREATE TRIGGER IF NOT EXISTS "recipes_recipe_search_insert" '
+        'AFTER INSERT ON "recipes_recipe" BEGIN '
+        'INSERT INTO "recipes_recipe_search" (rowid, name, text) '
+        'VALUES (new.id, new.name, new.text); END',
+        'CREATE TRIGGER IF NOT EXISTS "recipes_recipe_search_delete" '
+        'AFTER DELETE ON "recipes_recipe" BEGIN '
+        'INSERT INTO "recipes_recipe_search" '
+        '("recipes_recipe_search", rowid, name, text) '
+        "VALUES ('delete', old.id, old.name, old.text); END",
+        'CREATE TRIGGER IF NOT EXISTS "recipes_recipe_search_update" '
+        'AFTER UPDATE OF name, text ON "recipes_recipe" BEGIN '
+        'INSERT INTO "recipes_recipe_search" '
+        '("recipes_recipe_search", rowid, name, text) '
+        "VALUES ('delete', old.id, old.name, old.text); "
+        'INSERT INTO "recipes_recipe_search" (rowid, name, text) '
+        'VALUES (new.id, new.name, new.text); END',
+        'INSERT INTO "recipes_recipe_search" ("recipes_recipe_search") '
+        "VALUES ('rebuild')",
+    ],
+}
+
+DROP_INDEX_SQL = {
+    'postgresql': [
+        'DROP INDEX IF EXISTS recipe_search_vector_idx',
+        'ALTER TABLE "recipes_recipe" DROP COLUMN IF EXISTS search_vector',
+    ],
+    'sqlite': [
+        'DROP TRIGGER IF EXISTS "recipes_recipe_search_insert"',
+        'DROP TRIGGER IF EXISTS "recipes_recipe_search_delete"',
+        'DROP TRIGGER IF EXISTS "recipes_recipe_search_update"',
+        'DROP TABLE IF EXISTS "recipes_recipe_search"',
+    ],
+}
+
+
+def run_vendor_sql(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_vendor_sql(CREATE_INDEX_SQL),
+                             run_vendor_sql(DROP_INDEX_SQL)),
+    ]
@@ -1,13 +1,21 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from colorfield.fields import ColorField
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
 
 from recipes.utils import get_rnd_hex_color
 
 User = get_user_model()
 
+# Учитывают ли обработчики сигналов изменения ингредиентов рецептов и
+# удаление рецептов из списков покупок в агрегированных списках покупок.
+track_shopping_lists = ContextVar('track_shopping_lists', default=True)
+
 
 class Tag(models.Model):
     """Класс модели тэга.
@@ -63,6 +71,13 @@ class Ingredient(models.Model):
                 name='unique_name_unit_list'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=('name',),
+                name='ingredient_name_like_idx',
+                opclasses=('varchar_pattern_ops',)
+            )
+        ]
 
     def __str__(self):
         'Строковое представление модели.'
@@ -72,8 +87,10 @@ class Ingredient(models.Model):
 class Recipe(models.Model):
     """Класс модели рецепта.
 
-    Содержит поля автора, названия, изображения, текстовог описания,
-    ингредиентов, тэгов, времени приготовления и даты публикации.
+    Содержит поля автора, названия, изображения, признака создания
+    его производных изображений, текстовог описания, ингредиентов, тэгов,
+    времени приготовления, даты публикации, даты изменения и счётчика
+    добавлений в избранное.
     """
 
     author = models.ForeignKey(User,
@@ -86,6 +103,10 @@ class Recipe(models.Model):
         'Ссылка на изображение',
         upload_to='recipes/images/'
     )
+    image_derivatives = models.BooleanField(
+        'Производные изображения созданы',
+        default=False
+    )
     text = models.TextField(verbose_name='Текстовое описание')
     ingredients = models.ManyToManyField(Ingredient,
                                          through='RecipeIngredient',
@@ -100,6 +121,14 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    favourites_count = models.PositiveIntegerField(
+        'Добавили в избранное',
+        default=0
+    )
 
     class Meta:
         """Класс Meta модели."""
@@ -107,6 +136,14 @@ class Recipe(models.Model):
         ordering = ('-pub_date',)
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date'),
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=('-favourites_count', '-id'),
+                         name='recipe_favourites_count_idx'),
+        ]
 
     def __str__(self):
         """Строковое представление модели."""
@@ -128,17 +165,39 @@ class RecipeIngredient(models.Model):
                                verbose_name='Рецепт')
     amount = models.PositiveIntegerField(verbose_name='Количество')
 
+    SAVED_ROW_FIELDS = ('recipe_id', 'ingredient_id', 'amount')
+
     class Meta:
         """Класс Meta модели."""
 
         ordering = ('recipe',)
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецептах'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'ingredient'),
+                name='unique_recipe_ingredient'
+            )
+        ]
 
     def __str__(self):
         """Строковое представление модели."""
         return f'{self.ingredient} {self.recipe}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Метод создания объекта по строке базы данных.
+
+        Запоминает рецепт, ингредиент и количество из базы данных, чтобы
+        при изменении и удалении объекта учесть в списках покупок
+        сохранённые значения, а не изменённые в памяти.
+        """
+        instance = super().from_db(db, field_names, values)
+        if set(cls.SAVED_ROW_FIELDS) <= set(field_names):
+            instance._saved_row = tuple(
+                getattr(instance, name) for name in cls.SAVED_ROW_FIELDS)
+        return instance
+
 
 class UserRecipeModelMixin(models.Model):
     """Родительская абстрактная модель для списка покупок и
@@ -194,6 +253,152 @@ class Favourites(UserRecipeModelMixin):
         verbose_name = 'Рецепт в избранном'
         verbose_name_plural = 'Рецепты в избранном'
 
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'), name='unique_user_favourite'
+            )
+        ]
+
     def __str__(self):
         """Строковое представление модели."""
         return f'Избранный рецепт "{self.recipe}" у {self.user.username}'
+
+
+class ShoppingListItem(models.Model):
+    """Модель агрегированного списка покупок пользователя.
+
+    Хранит суммарное количество каждого ингредиента по всем рецептам
+    из списка покупок пользователя. Обновляется инкрементально при
+    изменении списка покупок и ингредиентов рецептов.
+    """
+
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='shopping_list_items',
+                             verbose_name='Пользователь')
+    ingredient = models.ForeignKey(Ingredient,
+                                   on_delete=models.CASCADE,
+                                   related_name='shopping_list_items',
+                                   verbose_name='Ингредиент')
+    amount = models.IntegerField(verbose_name='Количество', default=0)
+
+    class Meta:
+        """Класс Meta модели."""
+
+        ordering = ('user',)
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_user_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        """Строковое представление модели."""
+        return f'{self.ingredient} - {self.amount}'
+
+    @staticmethod
+    def get_recipe_amounts(*recipe_ids):
+        """Метод для получения суммарного количества ингредиентов
+        рецептов.
+        """
+        amounts = {}
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id', 'amount'):
+            amounts[ingredient_id] = amounts.get(ingredient_id, 0) + amount
+        return amounts
+
+    @classmethod
+    def apply_deltas(cls, user_ids, deltas):
+        """Метод для изменения списков покупок пользователей.
+
+        Прибавляет к количеству ингредиентов значения из словаря deltas
+        (id ингредиента: изменение) одним запросом UPDATE и удаляет
+        позиции с неположительным количеством.
+        """
+        deltas = {
+            ingredient_id: delta
+            for ingredient_id, delta in deltas.items() if delta
+        }
+        user_ids = list(user_ids)
+        if not deltas or not user_ids:
+            return
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                (
+                    cls(user_id=user_id, ingredient_id=ingredient_id)
+                    for user_id in user_ids
+                    for ingredient_id, delta in deltas.items() if delta > 0
+                ),
+                batch_size=settings.BULK_BATCH_SIZE,
+                ignore_conflicts=True
+            )
+            items = cls.objects.filter(user_id__in=user_ids,
+                                       ingredient_id__in=deltas)
+            items.update(amount=F('amount') + Case(
+                *(
+                    When(ingredient_id=ingredient_id, then=Value(delta))
+                    for ingredient_id, delta in deltas.items()
+                ),
+                default=Value(0),
+                output_field=models.IntegerField()
+            ))
+            items.filter(amount__lte=0).delete()
+
+    @classmethod
+    def add_recipe(cls, user_id, *recipe_ids):
+        """Метод для добавления ингредиентов рецептов в список покупок."""
+        cls.apply_deltas((user_id,), cls.get_recipe_amounts(*recipe_ids))
+
+    @classmethod
+    def remove_recipe(cls, user_id, *recipe_ids):
+        """Метод для удаления ингредиентов рецептов из списка покупок."""
+        cls.apply_deltas((user_id,), {
+            ingredient_id: -amount for ingredient_id, amount
+            in cls.get_recipe_amounts(*recipe_ids).items()
+        })
+
+    @classmethod
+    def update_recipe(cls, recipe_id, old_amounts, new_amounts):
+        """Метод для учёта изменения ингредиентов рецепта в списках
+        покупок всех пользователей, добавивших рецепт.
+        """
+        deltas = {
+            ingredient_id: (new_amounts.get(ingredient_id, 0)
+                            - old_amounts.get(ingredient_id, 0))
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()
+        }
+        if not any(deltas.values()):
+            return
+        cls.apply_deltas(
+            ShoppingCart.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('user_id', flat=True),
+            deltas
+        )
+
+    @staticmethod
+    @contextmanager
+    def untracked():
+        """Контекстный менеджер изменения ингредиентов рецептов и
+        удаления рецептов из списков покупок без учёта обработчиками
+        сигналов.
+
+        Используется кодом, который сам вызывает update_recipe для всех
+        изменений рецепта сразу.
+        """
+        token = track_shopping_lists.set(False)
+        try:
+            yield
+        finally:
+            track_shopping_lists.reset(token)
+
+    @staticmethod
+    def is_tracked():
+        """Метод проверки учёта изменений списков покупок обработчиками
+        сигналов.
+        """
+        return track_shopping_lists.get()
@@ -0,0 +1,121 @@
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from recipes.models import Recipe
+
+# Вес совпадений в названии относительно совпадений в описании для
+# ранжирования SQLite FTS5. В PostgreSQL название и описание имеют веса
+# A и B вектора поиска.
+SQLITE_NAME_WEIGHT = 2.5
+
+# Поля рецепта, по которым выполняется поиск.
+SEARCH_FIELDS = ('name', 'text')
+SEARCH_TABLE = f'{Recipe._meta.db_table}_search'
+SEARCH_TRIGGERS = {
+    f'{SEARCH_TABLE}_insert': (
+        'AFTER INSERT ON {recipes} BEGIN '
+        'INSERT INTO {search} (rowid, name, text) '
+        'VALUES (new.id, new.name, new.text); END'
+    ),
+    f'{SEARCH_TABLE}_delete': (
+        'AFTER DELETE ON {recipes} BEGIN '
+        'INSERT INTO {search} ({search}, rowid, name, text) '
+        "VALUES ('delete', old.id, old.name, old.text); END"
+    ),
+    f'{SEARCH_TABLE}_update': (
+        'AFTER UPDATE OF name, text ON {recipes} BEGIN '
+        'INSERT INTO {search} ({search}, rowid, name, text) '
+        "VALUES ('delete', old.id, old.name, old.text); "
+        'INSERT INTO {search} (rowid, name, text) '
+        'VALUES (new.id, new.name, new.text); END'
+    ),
+}
+
+
+def restore_search_triggers(connection):
+    """Функция восстановления триггеров индекса SQLite.
+
+    Индекс создаёт миграция 0010_recipe_search_index. SQLite изменяет
+    схему таблицы, пересоздавая её, и при этом удаляет триггеры. Если
+    таблица индекса есть, а триггеров не хватает, они создаются заново,
+    а индекс перестраивается.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    ops = connection.ops
+    recipes = ops.quote_name(Recipe._meta.db_table)
+    search = ops.quote_name(SEARCH_TABLE)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT type, name FROM sqlite_master '
+            'WHERE name = %s OR (tbl_name = %s AND type = %s)',
+            [SEARCH_TABLE, Recipe._meta.db_table, 'trigger']
+        )
+        names = {name for _, name in cursor.fetchall()}
+        if SEARCH_TABLE not in names or set(SEARCH_TRIGGERS) <= names:
+            return
+        for name, body in SEARCH_TRIGGERS.items():
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {ops.quote_name(name)} '
+                + body.format(recipes=recipes, search=search)
+            )
+        cursor.execute(
+            f"INSERT INTO {search} ({search}) VALUES ('rebuild')")
+
+
+def get_search_words(query):
+    """Функция выделения слов поискового запроса.
+
+    Знаки препинания и операторы языков запросов отбрасываются, чтобы
+    пользовательский ввод не приводил к синтаксическим ошибкам.
+    """
+    return re.findall(r'\w+', query.lower())
+
+
+def search_recipes(queryset, query):
+    """Функция полнотекстового поиска рецептов по названию и описанию.
+
+    Оставляет рецепты, содержащие все слова запроса, в том числе
+    как начала слов, и добавляет аннотацию search_rank: чем больше
+    значение, тем выше релевантность. Для СУБД без полнотекстового
+    индекса используется поиск подстрок.
+    """
+    words = get_search_words(query)
+    if not words:
+        return queryset.annotate(
+            search_rank=Value(0.0, FloatField())).none()
+    connection = connections[queryset.db]
+    ops = connection.ops
+    recipes = ops.quote_name(Recipe._meta.db_table)
+    if connection.vendor == 'postgresql':
+        tsquery = 'to_tsquery(%s::regconfig, %s)'
+        params = (settings.RECIPE_SEARCH_CONFIG,
+                  ' & '.join(f'{word}:*' for word in words))
+        return queryset.filter(RawSQL(
+            f'{recipes}.search_vector @@ {tsquery}', params,
+            output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank_cd({recipes}.search_vector, {tsquery})', params,
+            output_field=FloatField()
+        ))
+    if connection.vendor == 'sqlite':
+        search = ops.quote_name(SEARCH_TABLE)
+        match = ' AND '.join(f'"{word}"*' for word in words)
+        return queryset.filter(RawSQL(
+            f'{recipes}.id IN (SELECT rowid FROM {search} '
+            f'WHERE {search} MATCH %s)', (match,),
+            output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            f'(SELECT -bm25({search}, %s, 1.0) FROM {search} '
+            f'WHERE {search} MATCH %s AND rowid = {recipes}.id)',
+            (SQLITE_NAME_WEIGHT, match),
+            output_field=FloatField()
+        ))
+    for word in words:
+        queryset = queryset.filter(
+            Q(name__icontains=word) | Q(text__icontains=word))
+    return queryset.annotate(search_rank=Value(0.0, FloatField()))
@@ -0,0 +1,254 @@
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models.signals import (m2m_changed, post_delete, post_migrate,
+                                      post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+
+from recipes.images import has_derivatives
+from recipes.models import (Favourites, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingListItem, Tag)
+from recipes.search import SEARCH_FIELDS, restore_search_triggers
+from recipes.tasks import make_image_derivatives
+from recipes.utils import (bump_catalog_version, bump_count_version,
+                           change_counter, change_counters,
+                           relations_bulk_changed)
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def catalog_changed(sender, **kwargs):
+    """Обработчик сигнала изменения тэгов и ингредиентов.
+
+    Меняет версию справочника, чтобы процессы приложения
+    перестроили его снимок.
+    """
+    bump_catalog_version(sender)
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def shopping_cart_changing(sender, instance, **kwargs):
+    """Обработчик сигнала перед сохранением строки списка покупок.
+
+    Запоминает пользователя и рецепт изменяемой строки.
+    """
+    if not instance._state.adding:
+        instance._saved_row = ShoppingCart.objects.filter(
+            pk=instance.pk).values_list('user_id', 'recipe_id').first()
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(sender, instance, created, **kwargs):
+    """Обработчик сигнала добавления рецепта в список покупок.
+
+    При изменении пользователя или рецепта строки, например в админке,
+    ингредиенты прежнего рецепта вычитаются из прежнего списка.
+    """
+    if not created:
+        saved_row = getattr(instance, '_saved_row', None)
+        if saved_row in (None, (instance.user_id, instance.recipe_id)):
+            return
+        ShoppingListItem.remove_recipe(*saved_row)
+    if instance.recipe_id is not None:
+        ShoppingListItem.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_removed(sender, instance, **kwargs):
+    """Обработчик сигнала удаления рецепта из списка покупок.
+
+    При каскадном удалении рецепта вычитаются только ингредиенты,
+    которые ещё не удалены: остальные вычитает обработчик удаления
+    ингредиента рецепта.
+    """
+    if instance.recipe_id is not None and ShoppingListItem.is_tracked():
+        ShoppingListItem.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+def get_recipe_amounts(row, recipe_id):
+    """Функция получения количества ингредиента рецепта recipe_id из
+    строки (рецепт, ингредиент, количество).
+    """
+    if row is None or row[0] != recipe_id:
+        return {}
+    return {row[1]: row[2]}
+
+
+def update_shopping_lists(old_row, new_row):
+    """Функция учёта изменения строки ингредиента рецепта в списках
+    покупок пользователей, добавивших рецепт.
+
+    Строки задаются кортежами (рецепт, ингредиент, количество), None
+    означает отсутствие строки до или после изменения.
+    """
+    for recipe_id in {row[0] for row in (old_row, new_row) if row}:
+        ShoppingListItem.update_recipe(
+            recipe_id,
+            get_recipe_amounts(old_row, recipe_id),
+            get_recipe_amounts(new_row, recipe_id)
+        )
+
+
+def get_saved_row(instance):
+    """Функция получения строки ингредиента рецепта из базы данных.
+
+    Строка запоминается при загрузке объекта, а для объектов, созданных
+    в обход загрузки, выбирается отдельным запросом.
+    """
+    if not hasattr(instance, '_saved_row'):
+        instance._saved_row = RecipeIngredient.objects.filter(
+            pk=instance.pk
+        ).values_list(*RecipeIngredient.SAVED_ROW_FIELDS).first()
+    return instance._saved_row
+
+
+def get_current_row(instance):
+    """Функция получения строки ингредиента рецепта из объекта."""
+    return tuple(
+        getattr(instance, name) for name in RecipeIngredient.SAVED_ROW_FIELDS)
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+@receiver(pre_delete, sender=RecipeIngredient)
+def recipe_ingredient_changing(sender, instance, **kwargs):
+    """Обработчик сигнала перед изменением ингредиента рецепта.
+
+    Получает сохранённую строку до того, как её изменит запрос.
+    """
+    if ShoppingListItem.is_tracked() and not instance._state.adding:
+        get_saved_row(instance)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(sender, instance, created, **kwargs):
+    """Обработчик сигнала сохранения ингредиента рецепта.
+
+    Учитывает в списках покупок изменения, сделанные в обход
+    сериализатора рецепта: в админке, оболочке Django или скриптах.
+    """
+    row = get_current_row(instance)
+    if ShoppingListItem.is_tracked():
+        update_shopping_lists(
+            None if created else getattr(instance, '_saved_row', None), row)
+    instance._saved_row = row
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_removed(sender, instance, **kwargs):
+    """Обработчик сигнала удаления ингредиента рецепта."""
+    if ShoppingListItem.is_tracked():
+        update_shopping_lists(getattr(instance, '_saved_row', None), None)
+
+
+@receiver(post_save, sender=Favourites)
+def favourite_added(sender, instance, created, **kwargs):
+    """Обработчик сигнала добавления рецепта в избранное."""
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favourites_count', 1)
+
+
+@receiver(post_delete, sender=Favourites)
+def favourite_removed(sender, instance, **kwargs):
+    """Обработчик сигнала удаления рецепта из избранного."""
+    change_counter(Recipe, instance.recipe_id, 'favourites_count', -1)
+
+
+@receiver(relations_bulk_changed, sender=ShoppingCart)
+def shopping_cart_bulk_changed(sender, user_id, values, created, **kwargs):
+    """Обработчик сигнала пакетного изменения списка покупок."""
+    if created:
+        ShoppingListItem.add_recipe(user_id, *values)
+    else:
+        ShoppingListItem.remove_recipe(user_id, *values)
+
+
+@receiver(relations_bulk_changed, sender=Favourites)
+def favourites_bulk_changed(sender, values, created, **kwargs):
+    """Обработчик сигнала пакетного изменения избранного."""
+    change_counters(Recipe, values, 'favourites_count', 1 if created else -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_added(sender, instance, created, **kwargs):
+    """Обработчик сигнала создания рецепта."""
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_removed(sender, instance, **kwargs):
+    """Обработчик сигнала удаления рецепта."""
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_list_changed(sender, created=True, action='post_add',
+                        update_fields=None, **kwargs):
+    """Обработчик сигнала изменения состава списка рецептов.
+
+    Сбрасывает кэш общего числа рецептов при создании и удалении рецепта,
+    при изменении его тэгов, а также при сохранении названия или
+    описания, от которых зависит число найденных поиском рецептов.
+    """
+    if not action.startswith('post_'):
+        return
+    if (created or update_fields is None
+            or not set(SEARCH_FIELDS).isdisjoint(update_fields)):
+        bump_count_version(Recipe)
+
+
+@receiver(post_save, sender=Favourites)
+@receiver(post_delete, sender=Favourites)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def user_recipe_list_changed(sender, instance, **kwargs):
+    """Обработчик сигнала изменения избранного и списка покупок.
+
+    Сбрасывает кэш числа рецептов в фильтрах пользователя.
+    """
+    bump_count_version(Recipe, instance.user_id)
+
+
+@receiver(relations_bulk_changed, sender=Favourites)
+@receiver(relations_bulk_changed, sender=ShoppingCart)
+def user_recipe_list_bulk_changed(sender, user_id, **kwargs):
+    """Обработчик сигнала пакетного изменения избранного и списка покупок.
+
+    Сбрасывает кэш числа рецептов в фильтрах пользователя.
+    """
+    bump_count_version(Recipe, user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, update_fields=None, **kwargs):
+    """Обработчик сигнала сохранения изображения рецепта.
+
+    Если для текущего файла ещё нет производных изображений, снимает
+    отметку об их наличии и ставит задачу их создания в очередь, чтобы
+    перекодирование не увеличивало время ответа на запрос.
+    """
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if not instance.image or has_derivatives(instance.image):
+        return
+    if instance.image_derivatives:
+        Recipe.objects.filter(pk=instance.pk).update(image_derivatives=False)
+        instance.image_derivatives = False
+    make_image_derivatives.enqueue(recipe_id=instance.pk,
+                                   image=instance.image.name)
+
+
+@receiver(post_migrate)
+def search_index_migrated(sender, using, **kwargs):
+    """Обработчик сигнала применения миграций.
+
+    Восстанавливает триггеры полнотекстового индекса SQLite, удалённые
+    при пересоздании таблицы рецептов миграцией.
+    """
+    if sender.name == 'recipes':
+        restore_search_triggers(connections[using])
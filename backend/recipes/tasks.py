@@ -0,0 +1,19 @@
+from jobs.queue import task
+from recipes.images import make_derivatives
+from recipes.models import Recipe
+
+
+@task('recipes.make_image_derivatives', priority=10)
+def make_image_derivatives(recipe_id, image):
+    """Задача создания производных изображений рецепта.
+
+    Пропускается, если рецепт удалён или его изображение уже заменено
+    другим файлом, для которого поставлена своя задача.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id, image=image).only(
+        'pk', 'image').first()
+    if recipe is None:
+        return
+    ready = make_derivatives(recipe.image)
+    Recipe.objects.filter(pk=recipe_id, image=image).update(
+        image_derivatives=ready)
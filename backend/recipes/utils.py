@@ -1,4 +1,19 @@
+import json
+from datetime import datetime, timezone
 from random import randrange
+from time import time_ns
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal
+
+# Сигнал пакетного изменения связей пользователя с объектами модели.
+# Передаёт user_id, множество values id связанных объектов и признак
+# created: True при добавлении строк, False при удалении.
+relations_bulk_changed = Signal()
 
 
 def get_rnd_hex_color():
@@ -6,3 +21,306 @@ def get_rnd_hex_color():
     color = randrange(0, 2**24)
     hex_color = hex(color)
     return ("#" + hex_color[2:])
+
+
+def get_version_key(prefix, model, suffix=None):
+    """Функция получения ключа кэша для версии данных модели."""
+    key = f'{prefix}:{model._meta.label_lower}'
+    if suffix is not None:
+        key = f'{key}:{suffix}'
+    return key
+
+
+def get_version_cache():
+    """Функция получения кэша версий данных.
+
+    Версии хранятся в отдельном кэше с большим пределом числа записей,
+    чтобы переполнение общего кэша не удаляло их.
+    """
+    return caches[settings.VERSION_CACHE_ALIAS]
+
+
+def get_version(key):
+    """Функция получения текущей версии данных по ключу кэша.
+
+    Версия хранится в общем кэше, поэтому одинакова для всех
+    процессов приложения. Версией служит время изменения данных
+    в наносекундах.
+    """
+    version_cache = get_version_cache()
+    version = version_cache.get(key)
+    if version is None:
+        version_cache.add(key, str(time_ns()), timeout=None)
+        version = version_cache.get(key)
+    return version
+
+
+def add_version(key, version):
+    """Функция сохранения версии данных, если её ещё нет в кэше."""
+    get_version_cache().add(key, str(version), timeout=None)
+
+
+def bump_version(key):
+    """Функция смены версии данных по ключу кэша."""
+    get_version_cache().set(key, str(time_ns()), timeout=None)
+
+
+def get_catalog_version_key(model):
+    """Функция получения ключа кэша для версии справочника модели."""
+    return get_version_key(settings.CATALOG_VERSION_KEY_PREFIX, model)
+
+
+def get_catalog_version(model):
+    """Функция получения текущей версии справочника модели."""
+    return get_version(get_catalog_version_key(model))
+
+
+def get_catalog_last_modified(model):
+    """Функция получения времени изменения справочника модели."""
+    return datetime.fromtimestamp(
+        int(get_catalog_version(model)) / 10**9, tz=timezone.utc)
+
+
+def bump_catalog_version(model):
+    """Функция смены версии справочника модели после изменения данных."""
+    bump_version(get_catalog_version_key(model))
+
+
+def get_count_version(model, user_id=None):
+    """Функция получения версии кэша числа объектов модели.
+
+    При заданном user_id возвращается версия данных пользователя,
+    от которых зависят фильтры по избранному, списку покупок
+    и подпискам.
+    """
+    return get_version(get_version_key(
+        settings.COUNT_VERSION_KEY_PREFIX, model, user_id))
+
+
+def bump_count_version(model, user_id=None):
+    """Функция сброса кэша числа объектов модели после изменения данных."""
+    bump_version(get_version_key(
+        settings.COUNT_VERSION_KEY_PREFIX, model, user_id))
+
+
+def change_counter(model, pk, field, delta):
+    """Функция атомарного изменения счётчика field объекта модели.
+
+    Значение изменяется выражением F() в одном запросе UPDATE и не
+    становится отрицательным.
+    """
+    if pk is None:
+        return
+    change_counters(model, (pk,), field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    """Функция атомарного изменения счётчика field объектов модели.
+
+    Счётчики всех объектов с id из pks изменяются одним запросом UPDATE.
+    """
+    if not pks:
+        return
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def insert_if_absent(instance):
+    """Функция добавления объекта модели одним запросом INSERT.
+
+    Строка, нарушающая ограничение уникальности, не добавляется и не
+    вызывает IntegrityError, поэтому проверка дубликата не требует
+    отдельного запроса и выполняется корректно при параллельных
+    запросах. Сигнал post_save отправляется только при добавлении
+    строки. Возвращает True, если строка добавлена.
+    """
+    model = type(instance)
+    fields = [field for field in model._meta.concrete_fields
+              if not field.primary_key]
+    ops = connection.ops
+    sql = '{} {} ({}) VALUES ({}){}'.format(
+        ops.insert_statement(ignore_conflicts=True),
+        ops.quote_name(model._meta.db_table),
+        ', '.join(ops.quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+        ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)
+    )
+    params = [
+        field.get_db_prep_save(field.pre_save(instance, True), connection)
+        for field in fields
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        inserted = cursor.rowcount == 1
+    if inserted:
+        post_save.send(sender=model, instance=instance, created=True,
+                       update_fields=None, raw=False,
+                       using=connection.alias)
+    return inserted
+
+
+def delete_if_present(model, **filters):
+    """Функция удаления объекта модели одним запросом DELETE.
+
+    Объект задаётся значениями полей filters. Сигналы pre_delete и
+    post_delete отправляются только если строка была удалена, уже после
+    выполнения запроса. Возвращает True, если строка удалена.
+    """
+    fields = [model._meta.get_field(name) for name in filters]
+    instance = model(**{
+        field.attname: value
+        for field, value in zip(fields, filters.values())
+    })
+    ops = connection.ops
+    sql = 'DELETE FROM {} WHERE {}'.format(
+        ops.quote_name(model._meta.db_table),
+        ' AND '.join(f'{ops.quote_name(field.column)} = %s'
+                     for field in fields)
+    )
+    params = [
+        field.get_db_prep_save(getattr(instance, field.attname), connection)
+        for field in fields
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        deleted = cursor.rowcount > 0
+    if deleted:
+        for signal in (pre_delete, post_delete):
+            signal.send(sender=model, instance=instance,
+                        using=connection.alias)
+    return deleted
+
+
+def can_return_rows():
+    """Функция проверки поддержки RETURNING в запросах INSERT и DELETE."""
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return connection.features.can_return_columns_from_insert
+
+
+def bulk_insert_if_absent(model, user_id, field, values):
+    """Функция пакетного добавления связей пользователя с объектами.
+
+    Добавляет строки модели с пользователем user_id и значениями поля
+    field из values запросами INSERT по BULK_BATCH_SIZE строк. Строки,
+    нарушающие ограничение уникальности, не добавляются. Добавленные
+    строки возвращаются через RETURNING, а если СУБД его не
+    поддерживает, существующие строки выбираются заранее. После
+    добавления отправляется сигнал relations_bulk_changed. Возвращает
+    множество значений field добавленных строк.
+    """
+    user_field = model._meta.get_field('user')
+    value_field = model._meta.get_field(field)
+    ops = connection.ops
+    returning = can_return_rows()
+    values = list(values)
+    if not returning:
+        existing = set(model.objects.filter(
+            user_id=user_id, **{f'{field}__in': values}
+        ).values_list(value_field.attname, flat=True))
+        values = [value for value in values if value not in existing]
+    inserted = set() if returning else set(values)
+    sql = '{} {} ({}, {}) VALUES {{}}{}'.format(
+        ops.insert_statement(ignore_conflicts=True),
+        ops.quote_name(model._meta.db_table),
+        ops.quote_name(user_field.column),
+        ops.quote_name(value_field.column),
+        ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)
+    )
+    if returning:
+        sql += f' RETURNING {ops.quote_name(value_field.column)}'
+    batch_size = min(settings.BULK_BATCH_SIZE, ops.bulk_batch_size(
+        [user_field, value_field], values) or 1)
+    with connection.cursor() as cursor:
+        for start in range(0, len(values), batch_size):
+            batch = values[start:start + batch_size]
+            cursor.execute(
+                sql.format(', '.join(['(%s, %s)'] * len(batch))),
+                [param for value in batch for param in (user_id, value)]
+            )
+            if returning:
+                inserted.update(value for value, in cursor.fetchall())
+    if inserted:
+        relations_bulk_changed.send(sender=model, user_id=user_id,
+                                    values=inserted, created=True)
+    return inserted
+
+
+def bulk_delete_if_present(model, user_id, field, values):
+    """Функция пакетного удаления связей пользователя с объектами.
+
+    Удаляет строки модели с пользователем user_id и значениями поля
+    field из values запросами DELETE по BULK_BATCH_SIZE значений.
+    Удалённые строки возвращаются через RETURNING, а если СУБД его не
+    поддерживает, существующие строки выбираются заранее. После
+    удаления отправляется сигнал relations_bulk_changed. Возвращает
+    множество значений field удалённых строк.
+    """
+    user_field = model._meta.get_field('user')
+    value_field = model._meta.get_field(field)
+    ops = connection.ops
+    returning = can_return_rows()
+    values = list(values)
+    if not returning:
+        values = list(model.objects.filter(
+            user_id=user_id, **{f'{field}__in': values}
+        ).values_list(value_field.attname, flat=True))
+    deleted = set() if returning else set(values)
+    sql = 'DELETE FROM {} WHERE {} = %s AND {} IN ({{}})'.format(
+        ops.quote_name(model._meta.db_table),
+        ops.quote_name(user_field.column),
+        ops.quote_name(value_field.column)
+    )
+    if returning:
+        sql += f' RETURNING {ops.quote_name(value_field.column)}'
+    batch_size = min(settings.BULK_BATCH_SIZE,
+                     ops.bulk_batch_size([value_field], values) or 1)
+    with connection.cursor() as cursor:
+        for start in range(0, len(values), batch_size):
+            batch = values[start:start + batch_size]
+            cursor.execute(sql.format(', '.join(['%s'] * len(batch))),
+                           [user_id, *batch])
+            if returning:
+                deleted.update(value for value, in cursor.fetchall())
+    if deleted:
+        relations_bulk_changed.send(sender=model, user_id=user_id,
+                                    values=deleted, created=False)
+    return deleted
+
+
+def get_estimated_count(model):
+    """Функция получения оценки числа строк таблицы модели.
+
+    Использует статистику планировщика PostgreSQL. Для других СУБД
+    и таблиц без собранной статистики возвращает None.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def get_planner_estimate(queryset):
+    """Функция получения оценки числа строк выборки планировщиком.
+
+    Использует EXPLAIN PostgreSQL и не выполняет сам запрос. Для других
+    СУБД возвращает None.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
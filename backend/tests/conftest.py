@@ -0,0 +1,125 @@
+from io import StringIO
+
+import pytest
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db.models import F
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import local_cache
+from recipes.management.commands.reconcile_counters import \
+    Command as ReconcileCountersCommand
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import FoodgramUser
+
+PASSWORD = 'Secret-pass-42'
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+
+
+def clear_caches():
+    """Сбрасывает общие кэши и кэш токенов процесса."""
+    for cache in caches.all():
+        cache.clear()
+    local_cache.clear()
+
+
+def assert_relations_consistent():
+    """Проверяет счётчики и списки покупок после изменения связей."""
+    command = ReconcileCountersCommand
+    for model, counter, related_model, field in command.counters:
+        assert not model.objects.annotate(
+            actual=command.count_subquery(related_model, field)
+        ).exclude(**{counter: F('actual')}).exists(), counter
+    call_command('rebuild_shopping_lists', '--verify', stdout=StringIO())
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches():
+    clear_caches()
+    yield
+    clear_caches()
+
+
+@pytest.fixture
+def users(db):
+    return [
+        FoodgramUser.objects.create_user(
+            email=f'user{index}@foodgram.ru', username=f'user{index}',
+            first_name='Имя', last_name='Фамилия', password=PASSWORD
+        )
+        for index in range(4)
+    ]
+
+
+@pytest.fixture
+def user(users):
+    return users[0]
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name=f'Тег {index}', slug=f'tag{index}',
+                           color=f'#00000{index}')
+        for index in range(3)
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(name=f'Ингредиент {index}',
+                                  measurement_unit='г')
+        for index in range(6)
+    ]
+
+
+@pytest.fixture
+def make_recipes(users, tags, ingredients):
+    """Фабрика рецептов с двумя тегами и тремя ингредиентами."""
+    def make(count, author=None):
+        Recipe.objects.bulk_create(
+            Recipe(author=author or users[index % len(users)],
+                   name=f'Рецепт {index}', text=f'Описание {index}',
+                   cooking_time=10, image='recipes/images/recipe.png')
+            for index in range(count)
+        )
+        recipes = list(Recipe.objects.order_by('-id')[:count])[::-1]
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes for tag in tags[:2]
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=amount)
+            for recipe in recipes
+            for amount, ingredient in enumerate(ingredients[:3], 1)
+        )
+        call_command('reconcile_counters', stdout=StringIO())
+        return recipes
+    return make
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def token_client(user):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
@@ -0,0 +1,86 @@
+import pytest
+from conftest import PASSWORD
+from django.core.cache import cache
+
+from api.authentication import (CachedTokenAuthentication, get_shared_key,
+                                get_token_cache_stats, local_cache)
+
+
+def get_me(client):
+    response = client.get('/api/users/me/')
+    return response, response.get('Server-Timing', '')
+
+
+@pytest.fixture
+def cached_token(token_client, user):
+    """Токен пользователя, уже сохранённый в кэшах аутентификации."""
+    response, timing = get_me(token_client)
+    assert response.status_code == 200
+    assert 'auth;desc="db"' in timing
+    return token_client._credentials['HTTP_AUTHORIZATION'].split()[1]
+
+
+def test_cache_stores_no_sensitive_user_data(cached_token, user):
+    for entry in (cache.get(get_shared_key(cached_token)),
+                  local_cache.get(cached_token)):
+        assert entry is not None
+        assert user.password not in repr(entry)
+        assert user.email not in repr(entry)
+        assert user.username not in repr(entry)
+
+
+def test_cached_user_loads_full_profile(token_client, cached_token, user):
+    response, timing = get_me(token_client)
+    assert 'auth;desc="local"' in timing
+    assert response.data['email'] == user.email
+    assert response.data['username'] == user.username
+    local_cache.clear()
+    response, timing = get_me(token_client)
+    assert 'auth;desc="shared"' in timing
+    assert response.data['first_name'] == user.first_name
+    stats = get_token_cache_stats()
+    assert stats['shared'] == 1
+    assert stats['hit_rate'] == 1
+
+
+def test_cached_user_profile_loads_in_one_query(
+    cached_token, user, django_assert_num_queries
+):
+    source, token = CachedTokenAuthentication.get_cached_token(cached_token)
+    assert source == 'local'
+    with django_assert_num_queries(1):
+        assert token.user.email == user.email
+        assert token.user.last_name == user.last_name
+        assert token.user.recipes_count == user.recipes_count
+
+
+def test_logout_invalidates_cached_token(token_client, cached_token):
+    response = token_client.post('/api/auth/token/logout/')
+    assert response.status_code == 204
+    response, _ = get_me(token_client)
+    assert response.status_code == 401
+
+
+def test_password_change_invalidates_cached_token(
+    token_client, cached_token, user
+):
+    response = token_client.post('/api/users/set_password/', {
+        'current_password': PASSWORD,
+        'new_password': 'Another-pass-42',
+    })
+    assert response.status_code == 204
+    user.refresh_from_db()
+    assert user.check_password('Another-pass-42')
+    assert user.email == 'user0@foodgram.ru'
+    response, timing = get_me(token_client)
+    assert response.status_code == 200
+    assert 'auth;desc="db"' in timing
+
+
+def test_deactivation_invalidates_cached_token(
+    token_client, cached_token, user
+):
+    user.is_active = False
+    user.save()
+    response, _ = get_me(token_client)
+    assert response.status_code == 401
@@ -0,0 +1,116 @@
+import pytest
+from conftest import assert_relations_consistent
+
+from api.serializers import WriteFollowSerializer
+from recipes import utils
+from recipes.models import Favourites, Recipe, ShoppingCart
+from recipes.utils import bulk_delete_if_present, bulk_insert_if_absent
+from users.models import Follow, FoodgramUser
+
+
+@pytest.fixture(params=[True, False], ids=['returning', 'select'])
+def returning(request, monkeypatch, db):
+    """Проверяет оба способа определения изменённых строк."""
+    if request.param and not utils.can_return_rows():
+        pytest.skip('СУБД не поддерживает RETURNING.')
+    monkeypatch.setattr(utils, 'can_return_rows', lambda: request.param)
+    return request.param
+
+
+@pytest.fixture
+def recipes(make_recipes, users):
+    return make_recipes(3, author=users[1])
+
+
+def get_statuses(response):
+    assert response.status_code == 200
+    return {result['id']: result['status']
+            for result in response.data['results']}
+
+
+@pytest.mark.parametrize('model', [Favourites, ShoppingCart])
+def test_bulk_insert_and_delete_are_idempotent(returning, user, recipes,
+                                               model):
+    ids = [recipe.id for recipe in recipes]
+    assert bulk_insert_if_absent(model, user.id, 'recipe', ids[:2]) == set(
+        ids[:2])
+    assert_relations_consistent()
+    assert bulk_insert_if_absent(model, user.id, 'recipe', ids) == {ids[2]}
+    assert_relations_consistent()
+    assert bulk_insert_if_absent(model, user.id, 'recipe', ids) == set()
+    assert model.objects.filter(user=user).count() == 3
+    assert_relations_consistent()
+    assert bulk_delete_if_present(model, user.id, 'recipe', ids[1:]) == set(
+        ids[1:])
+    assert_relations_consistent()
+    assert bulk_delete_if_present(model, user.id, 'recipe', ids) == {ids[0]}
+    assert_relations_consistent()
+    assert bulk_delete_if_present(model, user.id, 'recipe', ids) == set()
+    assert not model.objects.exists()
+    assert_relations_consistent()
+
+
+def test_bulk_follow_insert_and_delete(returning, users):
+    ids = [user.id for user in users[1:]]
+    assert bulk_insert_if_absent(
+        Follow, users[0].id, 'following', ids) == set(ids)
+    assert bulk_insert_if_absent(
+        Follow, users[0].id, 'following', ids) == set()
+    assert set(FoodgramUser.objects.filter(id__in=ids).values_list(
+        'followers_count', flat=True)) == {1}
+    assert_relations_consistent()
+    assert bulk_delete_if_present(
+        Follow, users[0].id, 'following', ids) == set(ids)
+    assert bulk_delete_if_present(
+        Follow, users[0].id, 'following', ids) == set()
+    assert_relations_consistent()
+
+
+@pytest.mark.parametrize('action', ['bulk_favorite', 'bulk_shopping_cart'])
+def test_bulk_recipe_requests(returning, user_client, recipes, action):
+    url = f'/api/recipes/{action}/'
+    first, second, third = (recipe.id for recipe in recipes)
+    missing = Recipe.objects.order_by('-id').first().id + 1
+    response = user_client.post(url, {'ids': [first, missing, first]},
+                                format='json')
+    assert get_statuses(response) == {first: 201, missing: 404}
+    assert len(response.data['results']) == 2
+    assert_relations_consistent()
+    response = user_client.post(url, {'ids': [first, second]}, format='json')
+    assert get_statuses(response) == {first: 400, second: 201}
+    assert_relations_consistent()
+    response = user_client.delete(url, {'ids': [first, third, missing]},
+                                  format='json')
+    assert get_statuses(response) == {first: 204, third: 400, missing: 404}
+    assert_relations_consistent()
+    response = user_client.delete(url, {'ids': [first, second]},
+                                  format='json')
+    assert get_statuses(response) == {first: 400, second: 204}
+    assert_relations_consistent()
+
+
+@pytest.mark.parametrize('ids', [[], [0], ['id'], None])
+def test_bulk_request_with_invalid_ids(user_client, recipes, ids):
+    response = user_client.post('/api/recipes/bulk_favorite/',
+                                {'ids': ids}, format='json')
+    assert response.status_code == 400
+    assert not Favourites.objects.exists()
+    assert_relations_consistent()
+
+
+def test_bulk_subscribe_rejects_self(returning, user_client, users):
+    url = '/api/users/bulk_subscribe/'
+    ids = [user.id for user in users[:3]]
+    response = user_client.post(url, {'ids': ids}, format='json')
+    assert get_statuses(response) == {ids[0]: 400, ids[1]: 201, ids[2]: 201}
+    assert response.data['results'][0]['errors'] == (
+        WriteFollowSerializer.self_follow_message)
+    assert not Follow.objects.filter(following=users[0]).exists()
+    assert_relations_consistent()
+    response = user_client.post(url, {'ids': ids}, format='json')
+    assert get_statuses(response) == {ids[0]: 400, ids[1]: 400, ids[2]: 400}
+    assert_relations_consistent()
+    response = user_client.delete(url, {'ids': ids}, format='json')
+    assert get_statuses(response) == {ids[0]: 400, ids[1]: 204, ids[2]: 204}
+    assert not Follow.objects.exists()
+    assert_relations_consistent()
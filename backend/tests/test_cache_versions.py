@@ -0,0 +1,19 @@
+from django.core.cache import caches
+
+from recipes.models import Tag
+from recipes.utils import bump_catalog_version, get_catalog_version
+
+
+def test_versions_survive_default_cache_cull(settings, tmp_path):
+    settings.CACHES = {
+        alias: {**options, 'LOCATION': str(tmp_path / alias)}
+        for alias, options in settings.CACHES.items()
+    }
+    settings.CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 30}
+    version = get_catalog_version(Tag)
+    for index in range(300):
+        caches['default'].set(f'key{index}', index)
+    assert caches['default'].get('key0') is None
+    assert get_catalog_version(Tag) == version
+    bump_catalog_version(Tag)
+    assert get_catalog_version(Tag) != version
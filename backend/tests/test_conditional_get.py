@@ -0,0 +1,44 @@
+import pytest
+from django.utils.http import http_date
+
+from users.models import FoodgramUser
+
+
+@pytest.fixture
+def recipe(make_recipes, users):
+    recipe, = make_recipes(1, author=users[1])
+    return recipe
+
+
+def test_recipe_detail_has_no_last_modified(api_client, recipe):
+    response = api_client.get(f'/api/recipes/{recipe.id}/')
+    assert response.status_code == 200
+    assert response.has_header('ETag')
+    assert not response.has_header('Last-Modified')
+
+
+def test_favourite_changes_recipe_detail(api_client, user_client, recipe):
+    url = f'/api/recipes/{recipe.id}/'
+    response = api_client.get(url)
+    etag = response['ETag']
+    date = http_date(recipe.updated_at.timestamp())
+    assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    assert user_client.post(f'{url}favorite/').status_code == 201
+    response = api_client.get(url, HTTP_IF_MODIFIED_SINCE=date)
+    assert response.status_code == 200
+    assert response.data['favorites_count'] == 1
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+
+
+def test_author_rename_changes_recipe_detail(api_client, recipe):
+    url = f'/api/recipes/{recipe.id}/'
+    response = api_client.get(url)
+    etag = response['ETag']
+    date = http_date(recipe.updated_at.timestamp())
+    FoodgramUser.objects.filter(pk=recipe.author_id).update(
+        first_name='Новое имя')
+    response = api_client.get(url, HTTP_IF_MODIFIED_SINCE=date,
+                              HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.data['author']['first_name'] == 'Новое имя'
@@ -0,0 +1,54 @@
+import pytest
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+
+def walk_cursor(client, limit=3, between_pages=None):
+    ids = []
+    url = '/api/recipes/'
+    params = {'cursor': '', 'limit': limit}
+    while url:
+        response = client.get(url, params)
+        assert response.status_code == 200
+        ids += [recipe['id'] for recipe in response.data['results']]
+        url, params = response.data['next'], None
+        if url and between_pages:
+            between_pages()
+    return ids
+
+
+def test_cursor_walks_duplicate_pub_dates(api_client, make_recipes):
+    recipes = make_recipes(10)
+    Recipe.objects.filter(
+        pk__in=[recipe.id for recipe in recipes[2:8]]
+    ).update(pub_date=timezone.now())
+    expected = list(Recipe.objects.order_by(
+        '-pub_date', '-id').values_list('id', flat=True))
+    assert walk_cursor(api_client) == expected
+
+
+def test_cursor_ignores_recipes_added_between_pages(
+    api_client, make_recipes
+):
+    recipes = make_recipes(10)
+    added = []
+
+    def add_recipe():
+        added.extend(make_recipes(1))
+
+    ids = walk_cursor(api_client, between_pages=add_recipe)
+    assert added
+    assert sorted(ids) == sorted(recipe.id for recipe in recipes)
+    assert len(ids) == len(set(ids))
+
+
+@pytest.mark.parametrize('params', (
+    {'ordering': '-favorites_count'},
+    {'search': 'рецепт'},
+))
+def test_cursor_rejects_custom_ordering(api_client, make_recipes, params):
+    make_recipes(3)
+    response = api_client.get('/api/recipes/', {'cursor': '', **params})
+    assert response.status_code == 400
+    assert 'cursor' in response.data
@@ -0,0 +1,99 @@
+import base64
+import json
+import logging
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from api.performance import logger
+from recipes.models import Favourites, ShoppingCart
+
+# Запас бюджета над самым тяжёлым допустимым запросом: больший запас
+# перестал бы замечать лишние запросы.
+BUDGET_HEADROOM = 2
+
+
+class RecordsHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(json.loads(record.args[0]))
+
+
+@pytest.fixture
+def request_metrics():
+    handler = RecordsHandler()
+    level = logger.level
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    yield handler.records
+    logger.removeHandler(handler)
+    logger.setLevel(level)
+
+
+@pytest.fixture
+def popular_recipe(make_recipes, user, users):
+    recipe = make_recipes(1, author=user)[0]
+    for other in users[1:]:
+        ShoppingCart.objects.create(user=other, recipe=recipe)
+        Favourites.objects.create(user=other, recipe=recipe)
+    return recipe
+
+
+def get_image():
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8)).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+def assert_within_budget(records):
+    record, = records
+    assert record['status'] < 400
+    assert record['queries'] <= record['query_budget']
+    assert record['query_budget'] - record['queries'] <= BUDGET_HEADROOM
+
+
+def get_recipe_data(ingredients, tags):
+    return {
+        'ingredients': [
+            {'id': ingredient.id, 'amount': 50}
+            for ingredient in ingredients[2:]
+        ],
+        'tags': [tag.id for tag in tags[1:]],
+        'image': get_image(),
+        'name': 'Новое название',
+        'text': 'Новое описание',
+        'cooking_time': 30,
+    }
+
+
+def test_recipe_create_worst_case_fits_budget(
+    token_client, ingredients, tags, request_metrics
+):
+    response = token_client.post(
+        '/api/recipes/', get_recipe_data(ingredients, tags), format='json')
+    assert response.status_code == 201
+    assert_within_budget(request_metrics)
+
+
+@pytest.mark.parametrize('method', ('put', 'patch'))
+def test_recipe_update_worst_case_fits_budget(
+    token_client, popular_recipe, ingredients, tags, request_metrics, method
+):
+    response = getattr(token_client, method)(
+        f'/api/recipes/{popular_recipe.id}/',
+        get_recipe_data(ingredients, tags), format='json')
+    assert response.status_code == 200
+    assert_within_budget(request_metrics)
+
+
+def test_recipe_destroy_worst_case_fits_budget(
+    token_client, popular_recipe, request_metrics
+):
+    response = token_client.delete(f'/api/recipes/{popular_recipe.id}/')
+    assert response.status_code == 204
+    assert_within_budget(request_metrics)
@@ -0,0 +1,38 @@
+import pytest
+from conftest import clear_caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Favourites, ShoppingCart
+from users.models import Follow
+
+PAGE_SIZES = (6, 60, 600)
+
+
+@pytest.fixture
+def catalog(make_recipes, users):
+    recipes = make_recipes(max(PAGE_SIZES))
+    user = users[0]
+    Follow.objects.create(user=user, following=users[1])
+    Favourites.objects.bulk_create(
+        Favourites(user=user, recipe=recipe) for recipe in recipes[::3])
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=user, recipe=recipe) for recipe in recipes[::5])
+    return recipes
+
+
+@pytest.mark.parametrize('client_name', ('api_client', 'user_client'))
+def test_recipe_list_queries_do_not_depend_on_page_size(
+    request, catalog, django_assert_num_queries, client_name
+):
+    client = request.getfixturevalue(client_name)
+    smallest, *others = PAGE_SIZES
+    with CaptureQueriesContext(connection) as context:
+        response = client.get('/api/recipes/', {'limit': smallest})
+    assert len(response.data['results']) == smallest
+    for size in others:
+        clear_caches()
+        with django_assert_num_queries(len(context.captured_queries)):
+            response = client.get('/api/recipes/', {'limit': size})
+        assert response.status_code == 200
+        assert len(response.data['results']) == size
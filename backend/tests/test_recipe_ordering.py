@@ -0,0 +1,53 @@
+import pytest
+
+from api.filters import RecipesFilter
+from recipes.models import Recipe
+
+
+@pytest.fixture
+def recipes(make_recipes):
+    recipes = make_recipes(9)
+    for index, recipe in enumerate(recipes):
+        recipe.favourites_count = index % 2
+    Recipe.objects.bulk_update(recipes, ('favourites_count',))
+    return recipes
+
+
+def get_pages(client, ordering, limit=2):
+    ids = []
+    page = 1
+    while True:
+        response = client.get('/api/recipes/', {
+            'ordering': ordering, 'limit': limit, 'page': page})
+        assert response.status_code == 200
+        ids += [recipe['id'] for recipe in response.data['results']]
+        if not response.data['next']:
+            return ids
+        page += 1
+
+
+@pytest.mark.parametrize('ordering, reverse', (
+    ('-favorites_count', True),
+    ('favorites_count', False),
+))
+def test_popularity_ordering_has_unique_tie_breaker(
+    api_client, recipes, ordering, reverse
+):
+    expected = [
+        recipe.id for recipe in sorted(
+            recipes, key=lambda recipe: (recipe.favourites_count, recipe.id),
+            reverse=reverse
+        )
+    ]
+    assert get_pages(api_client, ordering) == expected
+
+
+@pytest.mark.parametrize('ordering, expected', (
+    ('-favorites_count', ('-favourites_count', '-id')),
+    ('favorites_count', ('favourites_count', 'id')),
+    ('-pub_date', ('-pub_date', '-id')),
+))
+def test_ordering_ends_with_id(db, ordering, expected):
+    queryset = RecipesFilter(
+        {'ordering': ordering}, queryset=Recipe.objects.all()).qs
+    assert queryset.query.order_by == expected
@@ -0,0 +1,109 @@
+import pytest
+from conftest import assert_relations_consistent
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Favourites, Recipe, ShoppingCart
+from recipes.utils import delete_if_present, insert_if_absent
+from users.models import Follow, FoodgramUser
+
+
+@pytest.fixture
+def recipes(make_recipes, users):
+    return make_recipes(2, author=users[1])
+
+
+@pytest.mark.parametrize('model, field', [
+    (Favourites, 'recipe'),
+    (ShoppingCart, 'recipe'),
+])
+def test_insert_and_delete_are_idempotent(user, recipes, model, field):
+    recipe = recipes[0]
+    assert insert_if_absent(model(user=user, **{field: recipe}))
+    assert_relations_consistent()
+    assert not insert_if_absent(model(user=user, **{field: recipe}))
+    assert model.objects.filter(user=user).count() == 1
+    assert_relations_consistent()
+    assert delete_if_present(model, user=user.id, **{field: recipe.id})
+    assert_relations_consistent()
+    assert not delete_if_present(model, user=user.id, **{field: recipe.id})
+    assert not model.objects.exists()
+    assert_relations_consistent()
+
+
+def test_follow_insert_and_delete_are_idempotent(users):
+    user, author = users[:2]
+    assert insert_if_absent(Follow(user=user, following=author))
+    assert not insert_if_absent(Follow(user=user, following=author))
+    author.refresh_from_db()
+    assert author.followers_count == 1
+    assert_relations_consistent()
+    assert delete_if_present(Follow, user=user.id, following=author.id)
+    assert not delete_if_present(Follow, user=user.id, following=author.id)
+    author.refresh_from_db()
+    assert author.followers_count == 0
+    assert_relations_consistent()
+
+
+@pytest.mark.parametrize('action', ['favorite', 'shopping_cart'])
+def test_repeated_recipe_requests(user_client, recipes, action):
+    url = f'/api/recipes/{recipes[0].id}/{action}/'
+    assert user_client.post(url).status_code == 201
+    response = user_client.post(url)
+    assert response.status_code == 400
+    assert 'errors' in response.data
+    assert_relations_consistent()
+    assert user_client.delete(url).status_code == 204
+    response = user_client.delete(url)
+    assert response.status_code == 400
+    assert 'errors' in response.data
+    assert_relations_consistent()
+
+
+@pytest.mark.parametrize('action', ['favorite', 'shopping_cart'])
+def test_missing_recipe_requests(user_client, recipes, action):
+    missing = Recipe.objects.order_by('-id').first().id + 1
+    url = f'/api/recipes/{missing}/{action}/'
+    assert user_client.post(url).status_code == 400
+    assert user_client.delete(url).status_code == 404
+    assert_relations_consistent()
+
+
+def test_repeated_subscribe_requests(user_client, users):
+    url = f'/api/users/{users[1].id}/subscribe/'
+    assert user_client.post(url).status_code == 201
+    assert user_client.post(url).status_code == 400
+    assert Follow.objects.count() == 1
+    assert_relations_consistent()
+    assert user_client.delete(url).status_code == 204
+    assert user_client.delete(url).status_code == 400
+    assert not Follow.objects.exists()
+    assert_relations_consistent()
+
+
+def test_subscribe_loads_author_once(user_client, users):
+    with CaptureQueriesContext(connection) as context:
+        response = user_client.post(f'/api/users/{users[1].id}/subscribe/')
+    assert response.status_code == 201
+    user_selects = [
+        query['sql'] for query in context.captured_queries
+        if query['sql'].startswith('SELECT')
+        and 'FROM "users_foodgramuser"' in query['sql']
+    ]
+    assert len(user_selects) == 1
+
+
+def test_missing_user_subscribe_requests(user_client, users):
+    missing = FoodgramUser.objects.order_by('-id').first().id + 1
+    url = f'/api/users/{missing}/subscribe/'
+    assert user_client.post(url).status_code == 404
+    assert user_client.delete(url).status_code == 404
+
+
+def test_self_subscribe_rejected(user_client, user):
+    response = user_client.post(f'/api/users/{user.id}/subscribe/')
+    assert response.status_code == 400
+    assert not Follow.objects.exists()
+    user.refresh_from_db()
+    assert user.followers_count == 0
+    assert_relations_consistent()
@@ -0,0 +1,58 @@
+import pytest
+from django.db import connection
+
+from recipes.models import Recipe
+from recipes.search import restore_search_triggers
+from recipes.utils import get_count_version
+
+
+def search(client, query):
+    response = client.get('/api/recipes/', {'search': query})
+    assert response.status_code == 200
+    return [recipe['name'] for recipe in response.data['results']]
+
+
+def test_search_uses_index_from_migration(api_client, make_recipes):
+    first, second, third = make_recipes(3)
+    Recipe.objects.filter(pk=first.pk).update(
+        name='Борщ', text='Свёкла и капуста')
+    Recipe.objects.filter(pk=second.pk).update(
+        name='Щи', text='Капуста и борщевик')
+    Recipe.objects.filter(pk=third.pk).update(
+        name='Окрошка', text='Квас')
+    assert search(api_client, 'борщ') == ['Борщ', 'Щи']
+    assert set(search(api_client, 'капуста борщ')) == {'Борщ', 'Щи'}
+    assert search(api_client, 'квас') == ['Окрошка']
+    Recipe.objects.filter(pk=third.pk).delete()
+    assert search(api_client, 'квас') == []
+
+
+def test_search_triggers_restored(api_client, make_recipes):
+    if connection.vendor != 'sqlite':
+        pytest.skip('Триггеры индекса используются только в SQLite.')
+    with connection.cursor() as cursor:
+        cursor.execute('DROP TRIGGER recipes_recipe_search_update')
+    recipe, = make_recipes(1)
+    Recipe.objects.filter(pk=recipe.pk).update(name='Солянка')
+    assert search(api_client, 'солянка') == []
+    restore_search_triggers(connection)
+    assert search(api_client, 'солянка') == ['Солянка']
+    Recipe.objects.filter(pk=recipe.pk).update(name='Рассольник')
+    assert search(api_client, 'рассольник') == ['Рассольник']
+
+
+def test_search_count_follows_renames(api_client, make_recipes):
+    recipe, _ = make_recipes(2)
+    recipe.name = 'Солянка'
+    recipe.save(update_fields=['name'])
+    response = api_client.get('/api/recipes/', {'search': 'солянка'})
+    assert response.data['count'] == 1
+    version = get_count_version(Recipe)
+    recipe.cooking_time = 20
+    recipe.save(update_fields=['cooking_time'])
+    assert get_count_version(Recipe) == version
+    recipe.name = 'Рассольник'
+    recipe.save(update_fields=['name'])
+    response = api_client.get('/api/recipes/', {'search': 'солянка'})
+    assert response.data['count'] == 0
+    assert response.data['results'] == []
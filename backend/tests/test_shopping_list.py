@@ -0,0 +1,173 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from recipes.models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+
+def get_shopping_list(user):
+    return dict(ShoppingListItem.objects.filter(
+        user=user).values_list('ingredient_id', 'amount'))
+
+
+def assert_shopping_lists_rebuilt():
+    """Проверяет, что списки покупок совпадают с пересчитанными."""
+    call_command('rebuild_shopping_lists', '--verify', stdout=StringIO())
+
+
+@pytest.fixture
+def recipes(make_recipes):
+    return make_recipes(3)
+
+
+@pytest.fixture
+def cart(user, users, recipes):
+    for recipe in recipes[:2]:
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+    ShoppingCart.objects.create(user=users[1], recipe=recipes[0])
+    return recipes[:2]
+
+
+def test_cart_add_and_remove(user_client, user, recipes, ingredients):
+    for recipe in recipes:
+        response = user_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        assert response.status_code == 201
+    assert get_shopping_list(user) == {
+        ingredient.id: amount * len(recipes)
+        for amount, ingredient in enumerate(ingredients[:3], 1)
+    }
+    assert_shopping_lists_rebuilt()
+    for recipe in recipes:
+        response = user_client.delete(
+            f'/api/recipes/{recipe.id}/shopping_cart/')
+        assert response.status_code == 204
+        assert_shopping_lists_rebuilt()
+    assert get_shopping_list(user) == {}
+
+
+def test_cart_bulk_add_and_remove(user_client, user, recipes):
+    ids = [recipe.id for recipe in recipes]
+    url = '/api/recipes/bulk_shopping_cart/'
+    for _ in range(2):
+        response = user_client.post(url, {'ids': ids}, format='json')
+        assert response.status_code == 200
+        assert_shopping_lists_rebuilt()
+    response = user_client.delete(url, {'ids': ids[:2]}, format='json')
+    assert response.status_code == 200
+    assert_shopping_lists_rebuilt()
+    assert ShoppingCart.objects.get(user=user).recipe_id == ids[2]
+
+
+def test_cart_item_update(user, users, cart, recipes):
+    cart_item = ShoppingCart.objects.get(user=users[1])
+    cart_item.recipe = recipes[2]
+    cart_item.save()
+    assert_shopping_lists_rebuilt()
+    cart_item.user = users[2]
+    cart_item.save()
+    assert_shopping_lists_rebuilt()
+    assert get_shopping_list(users[1]) == {}
+
+
+def test_recipe_update_through_api(users, cart, ingredients, tags):
+    recipe = cart[0]
+    author_client = APIClient()
+    author_client.force_authenticate(recipe.author)
+    response = author_client.patch(f'/api/recipes/{recipe.id}/', {
+        'ingredients': [
+            {'id': ingredients[0].id, 'amount': 10},
+            {'id': ingredients[4].id, 'amount': 5},
+        ],
+        'tags': [tags[0].id],
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+    }, format='json')
+    assert response.status_code == 200
+    assert_shopping_lists_rebuilt()
+    assert get_shopping_list(users[1]) == {
+        ingredients[0].id: 10, ingredients[4].id: 5}
+
+
+def test_recipe_ingredient_direct_changes(users, cart, ingredients):
+    recipe = cart[0]
+    RecipeIngredient.objects.create(
+        recipe=recipe, ingredient=ingredients[5], amount=7)
+    assert_shopping_lists_rebuilt()
+    recipe_ingredient = RecipeIngredient.objects.get(
+        recipe=recipe, ingredient=ingredients[0])
+    recipe_ingredient.amount = 20
+    recipe_ingredient.save()
+    assert_shopping_lists_rebuilt()
+    recipe_ingredient.ingredient = ingredients[4]
+    recipe_ingredient.save()
+    assert_shopping_lists_rebuilt()
+    RecipeIngredient.objects.get(
+        recipe=recipe, ingredient=ingredients[1]).delete()
+    assert_shopping_lists_rebuilt()
+    assert get_shopping_list(users[1]) == {
+        ingredients[2].id: 3, ingredients[4].id: 20, ingredients[5].id: 7}
+
+
+def test_recipe_ingredient_changes_in_admin(
+    client, django_user_model, users, cart, ingredients, tags
+):
+    recipe = cart[0]
+    client.force_login(django_user_model.objects.create_superuser(
+        email='admin@foodgram.ru', username='admin', password='Admin-42',
+        first_name='Админ', last_name='Админ'))
+    rows = list(RecipeIngredient.objects.filter(recipe=recipe))
+    data = {
+        'name': recipe.name,
+        'text': recipe.text,
+        'author': recipe.author_id,
+        'cooking_time': recipe.cooking_time,
+        'tags': [tags[0].id],
+        'recipe_ingredients-TOTAL_FORMS': len(rows) + 1,
+        'recipe_ingredients-INITIAL_FORMS': len(rows),
+        'recipe_ingredients-MIN_NUM_FORMS': 1,
+        'recipe_ingredients-MAX_NUM_FORMS': 1000,
+        'recipe_ingredients-3-recipe': recipe.id,
+        'recipe_ingredients-3-ingredient': ingredients[5].id,
+        'recipe_ingredients-3-amount': 4,
+    }
+    for index, row in enumerate(rows):
+        data.update({
+            f'recipe_ingredients-{index}-id': row.id,
+            f'recipe_ingredients-{index}-recipe': recipe.id,
+            f'recipe_ingredients-{index}-ingredient': row.ingredient_id,
+            f'recipe_ingredients-{index}-amount': row.amount * 10,
+        })
+    data['recipe_ingredients-0-DELETE'] = 'on'
+    response = client.post(
+        f'/admin/recipes/recipe/{recipe.id}/change/', data)
+    assert response.status_code == 302
+    assert_shopping_lists_rebuilt()
+    assert get_shopping_list(users[1]) == {
+        rows[1].ingredient_id: 20, rows[2].ingredient_id: 30,
+        ingredients[5].id: 4}
+
+
+def test_recipe_deletion_through_api(user, users, cart, ingredients):
+    author_client = APIClient()
+    author_client.force_authenticate(cart[0].author)
+    response = author_client.delete(f'/api/recipes/{cart[0].id}/')
+    assert response.status_code == 204
+    assert_shopping_lists_rebuilt()
+    assert get_shopping_list(users[1]) == {}
+    assert get_shopping_list(user) == {
+        ingredient.id: amount
+        for amount, ingredient in enumerate(ingredients[:3], 1)
+    }
+
+
+def test_recipe_and_ingredient_deletion(user, users, cart, ingredients):
+    cart[0].delete()
+    assert_shopping_lists_rebuilt()
+    assert get_shopping_list(users[1]) == {}
+    ingredients[0].delete()
+    assert_shopping_lists_rebuilt()
+    assert get_shopping_list(user) == {
+        ingredients[1].id: 2, ingredients[2].id: 3}
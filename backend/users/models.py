@@ -10,7 +10,7 @@ class FoodgramUser(AbstractUser):
     """Модель пользователя.
 
     Содержит дополнительные поля электронной почты, юзернейма, имени
-    и фамилии пользователя.
+    и фамилии пользователя, а также счётчики рецептов и подписчиков.
     """
 
     USERNAME_FIELD = 'email'
@@ -37,6 +37,10 @@ class FoodgramUser(AbstractUser):
                                   max_length=settings.FIRST_NAME_MAX_LEN)
     last_name = models.CharField('Фамилия',
                                  max_length=settings.SECOND_NAME_MAX_LEN)
+    recipes_count = models.PositiveIntegerField('Рецептов пользователя',
+                                                default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков',
+                                                  default=0)
 
     class Meta:
         """Класс Meta модели."""
@@ -49,6 +53,19 @@ class FoodgramUser(AbstractUser):
         """Строковое представление модели."""
         return f'Пользователь {self.username}'
 
+    def refresh_from_db(self, using=None, fields=None):
+        """Метод загрузки полей пользователя из базы данных.
+
+        Пользователь из кэша токенов содержит только поля для проверки
+        прав, поэтому при обращении к любому отложенному полю все
+        отложенные поля загружаются одним запросом.
+        """
+        if fields is not None:
+            deferred_fields = self.get_deferred_fields()
+            if deferred_fields.intersection(fields):
+                fields = deferred_fields.union(fields)
+        super().refresh_from_db(using, fields)
+
 
 class Follow(models.Model):
     """Модель подписки.
@@ -77,6 +94,10 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=['user', 'following'],
                                     name='unique_user_following')
         ]
+        indexes = [
+            models.Index(fields=['following', 'user'],
+                         name='follow_following_user_idx')
+        ]
 
     def __str__(self):
         """Строковое представление модели."""
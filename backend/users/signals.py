@@ -0,0 +1,63 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_user_tokens
+from recipes.utils import (bump_count_version, change_counter, change_counters,
+                           relations_bulk_changed)
+from users.models import Follow, FoodgramUser
+
+
+@receiver(post_save, sender=Follow)
+def follow_added(sender, instance, created, **kwargs):
+    """Обработчик сигнала оформления подписки."""
+    if created:
+        change_counter(FoodgramUser, instance.following_id,
+                       'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_removed(sender, instance, **kwargs):
+    """Обработчик сигнала удаления подписки."""
+    change_counter(FoodgramUser, instance.following_id,
+                   'followers_count', -1)
+
+
+@receiver(relations_bulk_changed, sender=Follow)
+def follows_bulk_changed(sender, user_id, values, created, **kwargs):
+    """Обработчик сигнала пакетного изменения подписок пользователя."""
+    change_counters(FoodgramUser, values, 'followers_count',
+                    1 if created else -1)
+    bump_count_version(FoodgramUser, user_id)
+
+
+@receiver(post_save, sender=FoodgramUser)
+@receiver(post_delete, sender=FoodgramUser)
+def user_list_changed(sender, created=True, **kwargs):
+    """Обработчик сигнала создания и удаления пользователя."""
+    if created:
+        bump_count_version(FoodgramUser)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def subscriptions_changed(sender, instance, **kwargs):
+    """Обработчик сигнала изменения подписок пользователя."""
+    bump_count_version(FoodgramUser, instance.user_id)
+
+
+@receiver(post_save, sender=FoodgramUser)
+def user_changed(sender, instance, created, **kwargs):
+    """Обработчик сигнала изменения пользователя.
+
+    Сбрасывает кэшированные токены, чтобы смена пароля, блокировка
+    и изменения профиля сразу применялись к аутентификации.
+    """
+    if not created:
+        invalidate_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Обработчик сигнала удаления токена при выходе пользователя."""
+    invalidate_user_tokens(instance.user_id)